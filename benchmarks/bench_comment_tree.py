@@ -0,0 +1,66 @@
+"""Benchmark indexing of large synthetic comment trees.
+
+Usage: python -m benchmarks.bench_comment_tree [comment count] [max depth]
+"""
+
+import sys
+import timeit
+
+import redterm.comments
+
+from benchmarks.fixtures import make_comment_tree
+
+
+def flatten(comments):
+    """Flatten comment tree in display order."""
+
+    flattened = []
+    stack = list(reversed(comments))
+    while stack:
+        comment = stack.pop()
+        flattened.append(comment)
+        stack.extend(reversed(comment.replies))
+    return flattened
+
+
+def get_comment_depth_by_id_list(submission_id, comments):
+    """Depth computation used before CommentTree, for comparison."""
+
+    comment_depth = [0]
+    comment_indentation_depth = 0
+    comment_indentation_depth_ids = [submission_id]
+
+    for comment in comments:
+        if comment.parent_id[3:] in comment_indentation_depth_ids:
+            comment_indentation_depth = comment_indentation_depth_ids.index(comment.parent_id[3:])
+            comment_indentation_depth_ids = comment_indentation_depth_ids[0:comment_indentation_depth + 1]
+        else:
+            comment_indentation_depth += 1
+            comment_indentation_depth_ids.append(comment.parent_id[3:])
+
+        comment_depth.append(comment_indentation_depth)
+
+    return comment_depth
+
+
+def main(count=50000, max_depth=12):
+    top_level = make_comment_tree(count, max_depth)
+    flattened = flatten(top_level)
+    tree = redterm.comments.CommentTree(top_level)
+    assert [node.depth for node in tree] == [comment.depth for comment in flattened]
+
+    results = [
+        ('depth by id list', lambda: get_comment_depth_by_id_list('submission', flattened)),
+        ('CommentTree build', lambda: redterm.comments.CommentTree(top_level)),
+        ('depth lookup x all', lambda: [tree.depth(index) for index in range(len(tree))]),
+        ('parent lookup x all', lambda: [tree.parent(index) for index in range(len(tree))]),
+        ('next sibling x all', lambda: [tree.next_sibling(index) for index in range(len(tree))]),
+    ]
+
+    print('{} comments, max depth {}'.format(count, max_depth))
+    for name, function in results:
+        print('{:<24}{:>10.2f} ms'.format(name, min(timeit.repeat(function, number=1, repeat=5)) * 1000))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
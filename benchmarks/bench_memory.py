@@ -0,0 +1,94 @@
+"""Compare memory held per item by PRAW objects and by the records pages keep instead.
+
+Usage: python -m benchmarks.bench_memory [item count]
+
+PRAW objects are built offline from JSON shaped like what reddit's listings return, which carry many more fields than
+pages display.
+"""
+
+import sys
+import tracemalloc
+
+import praw
+import praw.objects
+
+import redterm.api
+import redterm.records
+
+
+SUBMISSION_EXTRA_FIELDS = ('domain', 'banned_by', 'media_embed', 'thumbnail', 'subreddit_id', 'edited', 'link_flair_css_class',
+                           'author_flair_css_class', 'downs', 'secure_media_embed', 'saved', 'removal_reason',
+                           'stickied', 'from', 'is_self', 'from_id', 'link_flair_text', 'hidden', 'from_kind',
+                           'distinguished', 'media', 'suggested_sort', 'secure_media', 'locked', 'archived', 'over_18',
+                           'hide_score', 'approved_by', 'report_reasons', 'user_reports', 'mod_reports', 'gilded',
+                           'clicked', 'visited', 'likes', 'quarantine', 'ups', 'selftext_html', 'created',
+                           'author_flair_text', 'num_reports', 'post_hint', 'preview')
+COMMENT_EXTRA_FIELDS = ('subreddit_id', 'banned_by', 'removal_reason', 'link_id', 'likes', 'user_reports', 'saved',
+                        'gilded', 'archived', 'report_reasons', 'controversiality', 'body_html', 'subreddit',
+                        'score_hidden', 'edited', 'author_flair_css_class', 'downs', 'stickied', 'approved_by',
+                        'ups', 'mod_reports', 'num_reports', 'distinguished', 'author_flair_text', 'created')
+
+
+def submission_json(submission_no):
+    """Return JSON of a submission as found in a listing."""
+
+    json_dict = {field: None for field in SUBMISSION_EXTRA_FIELDS}
+    json_dict.update({'id': 's{}'.format(submission_no), 'name': 't3_s{}'.format(submission_no),
+                      'title': 'Submission title number {} with a few more words'.format(submission_no),
+                      'url': 'https://example.com/article/{}'.format(submission_no),
+                      'permalink': '/r/python/comments/s{}/submission_title/'.format(submission_no),
+                      'score': submission_no, 'num_comments': 42, 'author': 'author{}'.format(submission_no),
+                      'subreddit': 'python', 'selftext': '', 'created_utc': 1450000000.0 + submission_no,
+                      'domain': 'example.com', 'thumbnail': 'https://b.thumbs.redditmedia.com/{}.jpg'.format(submission_no),
+                      'preview': {'images': [{'source': {'url': 'https://i.redditmedia.com/{}.jpg'.format(submission_no),
+                                                         'width': 640, 'height': 480}, 'resolutions': []}]},
+                      'media_embed': {}, 'secure_media_embed': {}, 'user_reports': [], 'mod_reports': []})
+    return json_dict
+
+
+def comment_json(comment_no):
+    """Return JSON of a comment as found in a comment tree, without replies."""
+
+    json_dict = {field: None for field in COMMENT_EXTRA_FIELDS}
+    body = 'Comment number {} saying something of about average length for a reddit comment. '.format(comment_no) * 2
+    json_dict.update({'id': 'c{}'.format(comment_no), 'name': 't1_c{}'.format(comment_no), 'parent_id': 't3_s0',
+                      'author': 'author{}'.format(comment_no), 'score': comment_no, 'body': body,
+                      'body_html': '&lt;div class="md"&gt;&lt;p&gt;' + body + '&lt;/p&gt;&lt;/div&gt;',
+                      'created_utc': 1450000000.0, 'link_id': 't3_s0', 'subreddit': 'python', 'replies': '',
+                      'user_reports': [], 'mod_reports': []})
+    return json_dict
+
+
+def measure(build, count):
+    """Return bytes allocated per item by build(item_no), for items still held at the end."""
+
+    tracemalloc.start()
+    snapshot_start = tracemalloc.take_snapshot()
+    items = [build(item_no) for item_no in range(count)]
+    snapshot_end = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    size = sum(stat.size_diff for stat in snapshot_end.compare_to(snapshot_start, 'filename'))
+    del items
+    return size / count
+
+
+def main(count=5000):
+    reddit = redterm.api.create_reddit()
+
+    results = [
+        ('praw Submission', lambda item_no: praw.objects.Submission(reddit, submission_json(item_no))),
+        ('SubmissionRecord', lambda item_no: redterm.records.SubmissionRecord(
+            praw.objects.Submission(reddit, submission_json(item_no)))),
+        ('praw Comment', lambda item_no: praw.objects.Comment(reddit, comment_json(item_no))),
+        ('CommentRecord', lambda item_no: redterm.records.CommentRecord(
+            praw.objects.Comment(reddit, comment_json(item_no)))),
+    ]
+
+    print('{} items'.format(count))
+    for name, build in results:
+        print('{:<24}{:>10.0f} bytes per item'.format(name, measure(build, count)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
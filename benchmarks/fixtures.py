@@ -0,0 +1,150 @@
+"""Synthetic stand-ins for PRAW objects and blessed.Terminal, so that benchmarks run without reddit or a tty."""
+
+import io
+import random
+
+import blessed
+
+
+WORDS = ('reddit', 'terminal', 'python', 'comment', 'thread', 'the', 'of', 'and', 'a', 'is', 'that', 'for',
+         'submission', 'layout', 'width', '日本語', '한국어', '中文')
+
+
+def make_text(rng, word_count):
+    """Return random text of word_count words, mixing narrow and wide characters."""
+
+    return ' '.join(rng.choice(WORDS) for word_no in range(word_count))
+
+
+class Comment:
+    """Stand-in for praw.objects.Comment."""
+
+    def __init__(self, comment_id, parent_id, body='', author='author', score=1):
+        self.id = comment_id
+        self.name = 't1_' + comment_id
+        self.parent_id = parent_id
+        self.body = body
+        self.author = author
+        self.score = score
+        self.replies = []
+
+
+class MoreComments:
+    """Stand-in for praw.objects.MoreComments."""
+
+    def __init__(self, comment_id, parent_id, count):
+        self.id = comment_id
+        self.name = 't1_' + comment_id
+        self.parent_id = parent_id
+        self.count = count
+        self.children = []
+
+
+class Submission:
+    """Stand-in for praw.objects.Submission, with comments attached up front."""
+
+    def __init__(self, submission_no, rng, comments=()):
+        self.id = 's{}'.format(submission_no)
+        self.name = 't3_' + self.id
+        self.title = make_text(rng, rng.randint(4, 30))
+        self.url = 'https://example{}.com/{}'.format(submission_no % 50, submission_no)
+        self.permalink = 'https://www.reddit.com/r/python/comments/' + self.id
+        self.score = rng.randint(0, 50000)
+        self.num_comments = len(comments)
+        self.author = 'author{}'.format(submission_no % 1000)
+        self.subreddit = 'python'
+        self.selftext = make_text(rng, rng.randint(0, 200))
+        self.created_utc = 1450000000.0 + submission_no
+        self.comments = list(comments)
+
+
+def make_listing(count, seed=0):
+    """Yield count submissions, like praw's get_hot() does."""
+
+    rng = random.Random(seed)
+    for submission_no in range(count):
+        yield Submission(submission_no, rng)
+
+
+def make_comment_tree(count, max_depth=12, more_every=0, seed=0):
+    """Return top level comments of a random tree of count comments.
+
+    Comments mostly reply to recent comments so that threads get deep. If more_every is not 0, every more_every-th
+    comment is a MoreComments placeholder instead.
+    """
+
+    rng = random.Random(seed)
+    top_level = []
+    comments = []
+    for comment_no in range(count):
+        parent = comments[-rng.randint(1, min(len(comments), 5))] if comments and rng.random() < 0.9 else None
+        if parent is not None and (parent.depth >= max_depth or not hasattr(parent, 'body')):
+            parent = None
+
+        comment_id = 'c{}'.format(comment_no)
+        parent_id = 't1_' + parent.id if parent else 't3_s0'
+        if more_every and comment_no % more_every == more_every - 1:
+            comment = MoreComments(comment_id, parent_id, rng.randint(1, 200))
+        else:
+            comment = Comment(comment_id, parent_id, make_text(rng, rng.randint(1, 120)),
+                              'author{}'.format(rng.randint(0, 5000)), rng.randint(-10, 5000))
+
+        comment.depth = parent.depth + 1 if parent else 0
+        (parent.replies if parent else top_level).append(comment)
+        comments.append(comment)
+
+    return top_level
+
+
+def make_submission(comment_count, max_depth=12, more_every=0, seed=0):
+    """Return a submission with a random comment tree."""
+
+    return Submission(0, random.Random(seed), make_comment_tree(comment_count, max_depth, more_every, seed))
+
+
+class Subreddit:
+    """Stand-in for praw.objects.Subreddit."""
+
+    def __init__(self, submissions):
+        self.submissions = submissions
+
+    def get_hot(self, limit=None, params=None):
+        return iter(self.submissions[:limit])
+
+
+class Reddit:
+    """Stand-in for praw.Reddit serving synthetic listings and submissions without network access."""
+
+    def __init__(self, submission_count=1000, comment_count=500, max_depth=12, more_every=0, seed=0):
+        self.submissions = list(make_listing(submission_count, seed))
+        self.submission = make_submission(comment_count, max_depth, more_every, seed)
+
+    def get_subreddit(self, subreddit_title):
+        return Subreddit(self.submissions)
+
+    def get_submission(self, submission_id=None):
+        return self.submission
+
+
+class HeadlessTerminal(blessed.Terminal):
+    """blessed.Terminal with a fixed, settable size, writing its output to memory instead of a tty."""
+
+    def __init__(self, width=120, height=40):
+        blessed.Terminal.__init__(self, kind='xterm-256color', stream=io.StringIO(), force_styling=True)
+
+        self._width = width
+        self._height = height
+
+    @property
+    def width(self):
+        return self._width
+
+    @property
+    def height(self):
+        return self._height
+
+    def resize(self, width, height):
+        """Change size reported to redterm."""
+
+        self._width = width
+        self._height = height
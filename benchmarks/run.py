@@ -0,0 +1,222 @@
+"""Benchmark redterm's hot paths against a synthetic reddit and a headless terminal.
+
+Usage: python -m benchmarks.run [--output results.json] [--compare baseline.json]
+
+Results are written as JSON, so that runs on different commits can be compared with --compare.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import redterm.api
+import redterm.pages
+import redterm.scheduler
+import redterm.terminal
+
+from benchmarks import fixtures
+
+
+WIDTH = 120                          # Terminal size benchmarks start at
+HEIGHT = 40
+RESIZE_WIDTHS = (80, 160, 100, 120)  # Widths terminal is resized through in resize benchmark
+SCROLL_STEPS = 200                   # Number of items moved through in scroll benchmark
+PAGE_STEPS = 20                      # Number of screens moved through in page down benchmark
+REGRESSION = 0.1                     # Relative slowdown of median reported as regression by --compare
+
+
+def install(terminal, reddit):
+    """Point redterm at headless terminal and synthetic reddit, with no rate limit for requests to it."""
+
+    redterm.terminal.terminal = terminal
+    redterm.pages.api = redterm.api.API(reddit, scheduler=redterm.scheduler.Scheduler(rate=None))
+
+
+def make_io(terminal, page):
+    """Return IO showing page, drawing to headless terminal instead of stdout."""
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        terminal_io = redterm.terminal.IO()
+    terminal_io.screen.stream = terminal.stream
+    terminal_io.pages.append(page)
+    return terminal_io
+
+
+def time_import(module):
+    """Return seconds a fresh interpreter takes to import module, not counting interpreter startup."""
+
+    code = 'import time; time_start = time.perf_counter(); import {}; print(time.perf_counter() - time_start)'.format(module)
+    output = subprocess.check_output([sys.executable, '-c', code], stderr=subprocess.DEVNULL,
+                                     cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return float(output.split()[-1])
+
+
+def measure(run, setup=None, repeat=5, teardown=None):
+    """Return run times in seconds of run(state), where state is returned by setup() and passed to teardown() afterwards,
+    neither of which is timed.
+    """
+
+    times = []
+    for repeat_no in range(repeat):
+        state = setup() if setup else None
+        time_start = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - time_start)
+        if teardown:
+            teardown(state)
+    return times
+
+
+def scroll(terminal_io):
+    """Move selection down through SCROLL_STEPS items, then back up, rendering after each move."""
+
+    for step in range(SCROLL_STEPS):
+        terminal_io.select_item_next()
+        terminal_io.render()
+    for step in range(SCROLL_STEPS):
+        terminal_io.select_item_prev()
+        terminal_io.render()
+
+
+def page_down(terminal_io):
+    """Move selection down a screen at a time."""
+
+    for step in range(PAGE_STEPS):
+        terminal_io.select_item_nextscreen()
+        terminal_io.render()
+
+
+def resize(terminal, terminal_io):
+    """Resize terminal through RESIZE_WIDTHS, reflowing page each time."""
+
+    for width in RESIZE_WIDTHS:
+        terminal.resize(width, HEIGHT)
+        terminal_io.reflow()
+
+
+def run_benchmarks(arguments):
+    """Run all benchmarks. Returns dict of run times by benchmark name."""
+
+    terminal = fixtures.HeadlessTerminal(WIDTH, HEIGHT)
+    reddit = fixtures.Reddit(arguments.submissions, arguments.comments, arguments.max_depth, arguments.more_every)
+    install(terminal, reddit)
+    repeat = arguments.repeat
+
+    def new_subreddit(virtual=False):
+        terminal.resize(WIDTH, HEIGHT)
+        page = redterm.pages.PageSubreddit('python', WIDTH, submissions=iter(reddit.submissions), virtual=virtual)
+        while not page._exhausted:
+            page.update()
+        return page
+
+    def new_submission(virtual=False):
+        terminal.resize(WIDTH, HEIGHT)
+        return redterm.pages.PageSubmission(reddit.submission, WIDTH, stream=False, virtual=virtual)
+
+    def first_paint(state):
+        page = redterm.pages.PageSubreddit('python', WIDTH, submissions=iter(reddit.submissions), stream=True)
+        terminal_io = make_io(terminal, page)
+        terminal_io.render()
+        return terminal_io
+
+    results = {}
+    results['startup_import'] = [time_import('redterm.__main__') for repeat_no in range(repeat)]
+    results['startup_first_paint'] = measure(lambda state: first_paint(state).close(), repeat=repeat)
+    results['subreddit_construct'] = measure(lambda state: new_subreddit(), repeat=repeat)
+    results['submission_construct'] = measure(lambda state: new_submission(), repeat=repeat)
+    results['subreddit_format'] = measure(lambda page: page.item_strings_formatted, new_subreddit, repeat)
+    results['submission_format'] = measure(lambda page: page.item_strings_formatted, new_submission, repeat)
+
+    for mode, virtual in (('buffered', False), ('virtual', True)):
+        for page_name, new_page in (('subreddit', new_subreddit), ('submission', new_submission)):
+            def setup():
+                return make_io(terminal, new_page(virtual))
+
+            def setup_rendered():
+                terminal_io = setup()
+                terminal_io.render()
+                return terminal_io
+
+            prefix = '{}_{}_'.format(page_name, mode)
+            close = redterm.terminal.IO.close
+            results[prefix + 'render_first'] = measure(lambda terminal_io: terminal_io.render(), setup, repeat, close)
+            results[prefix + 'scroll'] = measure(scroll, setup_rendered, repeat, close)
+            results[prefix + 'page_down'] = measure(page_down, setup_rendered, repeat, close)
+            results[prefix + 'resize'] = measure(lambda terminal_io: resize(terminal, terminal_io), setup_rendered, repeat,
+                                                 close)
+
+    return results
+
+
+def get_commit():
+    """Return hash of checked out commit, or None if not in a git repository."""
+
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(times):
+    """Return summary of run times in milliseconds."""
+
+    return {'min': min(times) * 1000,
+            'median': statistics.median(times) * 1000,
+            'runs': len(times)}
+
+
+def compare(results, baseline):
+    """Print change of median run times against baseline results."""
+
+    print('\nCompared to {}:'.format(baseline.get('commit') or 'baseline'))
+    if baseline.get('parameters') != results['parameters']:
+        print('Warning: baseline was run with different parameters {}'.format(baseline.get('parameters')))
+    for name, summary in sorted(results['benchmarks'].items()):
+        summary_baseline = baseline['benchmarks'].get(name)
+        if summary_baseline is None:
+            continue
+        change = summary['median'] / summary_baseline['median'] - 1 if summary_baseline['median'] else 0
+        print('{:<36}{:>10.2f} ms{:>+9.1%}{}'.format(name, summary['median'], change,
+                                                  '  REGRESSION' if change > REGRESSION else ''))
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description='Benchmark redterm against a synthetic reddit.')
+    argument_parser.add_argument('--submissions', type=int, default=1000, help='Number of submissions in listing')
+    argument_parser.add_argument('--comments', type=int, default=2000, help='Number of comments in submission')
+    argument_parser.add_argument('--max-depth', type=int, default=12, help='Max depth of comment tree')
+    argument_parser.add_argument('--more-every', type=int, default=50, help='Make every n-th comment "More comments"')
+    argument_parser.add_argument('--repeat', type=int, default=5, help='Number of runs of each benchmark')
+    argument_parser.add_argument('--output', help='Write results to this JSON file')
+    argument_parser.add_argument('--compare', help='Compare results with this JSON file')
+    arguments = argument_parser.parse_args()
+
+    results = {'commit': get_commit(),
+               'python': sys.version.split()[0],
+               'platform': platform.platform(),
+               'parameters': {'submissions': arguments.submissions, 'comments': arguments.comments,
+                              'max_depth': arguments.max_depth, 'more_every': arguments.more_every,
+                              'width': WIDTH, 'height': HEIGHT},
+               'benchmarks': {name: summarize(times) for name, times in run_benchmarks(arguments).items()}}
+
+    for name, summary in results['benchmarks'].items():
+        print('{:<36}{:>10.2f} ms  (min {:.2f} ms)'.format(name, summary['median'], summary['min']))
+
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+
+    if arguments.compare:
+        with open(arguments.compare, 'r') as file:
+            compare(results, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,91 +1,382 @@
+import time
+
+STARTED = time.perf_counter()  # Startup time is measured from here, before anything else is imported
+
 import argparse
+import contextlib
 import logging
 import os
+import sys
 
 import yaml
 
+import redterm.api
 import redterm.browser
+import redterm.cache
+import redterm.dump
 import redterm.pages
+import redterm.prefetch
+import redterm.profiler
+import redterm.saved
+import redterm.scheduler
 import redterm.terminal
 
-logging.basicConfig(filename="./redterm.debug.log", level=logging.DEBUG, filemode="w")
+DIR_CONFIG = os.path.expanduser('~/.redterm/')
+FILE_CONFIG = DIR_CONFIG + 'config.yml'
+
+
+def parse_arguments():
+    """Return command line arguments."""
 
-argument_parser = argparse.ArgumentParser()
-argument_parser.add_argument('-s', '--subreddit', nargs=1, help='Go to specified subreddit')
-arguments = argument_parser.parse_args()
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument('-s', '--subreddit', nargs=1, help='Go to specified subreddit')
+    argument_parser.add_argument('--offline', action='store_true', help='Only show content from local cache')
+    argument_parser.add_argument('--profile', action='store_true', help='Time main loop phases, key actions and network calls, and print summary on exit')
+    argument_parser.add_argument('--cprofile', metavar='FILE', help='Also run cProfile for the session, saving stats to FILE')
+    argument_parser.add_argument('--dump', action='store_true', help='Write submissions or comments to stdout as they are fetched, instead of starting UI')
+    argument_parser.add_argument('--format', choices=('jsonl', 'text'), default='jsonl', help='Format of --dump, one JSON object per item or plain text')
+    argument_parser.add_argument('--submission', metavar='ID', help='With --dump, write comments of submission with given id instead of submissions')
+    argument_parser.add_argument('--limit', type=int, help='With --dump, write at most this many submissions or comments')
+    argument_parser.add_argument('--depth', type=int, help='With --dump, leave out replies of comments at this depth, top level comments being at 0')
+    return argument_parser.parse_args()
 
-# Load settings
-dir_config = os.environ['HOME'] + '/.redterm/'
-file_config = dir_config + 'config.yml'
 
-try:
-    with open(file_config, 'r') as file:
-        config = yaml.load(file)
-except OSError:
-    if not os.path.exists(dir_config):
-        os.makedirs(dir_config)
-    yaml.dump({'browser': 'lynx', 'subreddits': ['letsnotmeet', 'python']}, open(file_config, 'w'))
-    with open(file_config, 'r') as file:
-        config = yaml.load(file)
+def load_config():
+    """Return settings, writing default settings first if there are none."""
 
-logging.debug(config['browser'])
-logging.debug(config['subreddits'])
+    try:
+        with open(FILE_CONFIG, 'r') as file:
+            config = yaml.load(file)
+    except OSError:
+        if not os.path.exists(DIR_CONFIG):
+            os.makedirs(DIR_CONFIG)
+        yaml.dump({'browser': 'lynx', 'subreddits': ['letsnotmeet', 'python']}, open(FILE_CONFIG, 'w'))
+        with open(FILE_CONFIG, 'r') as file:
+            config = yaml.load(file)
+
+    logging.debug(config['browser'])
+    logging.debug(config['subreddits'])
+
+    return config
 
 
 def main():
     """First entry point."""
 
-    terminal_io = redterm.terminal.IO()
+    logging.basicConfig(filename="./redterm.debug.log", level=logging.DEBUG, filemode="w")
+
+    arguments = parse_arguments()
+    config = load_config()
+
+    if arguments.profile or arguments.cprofile:
+        redterm.profiler.profiler.enable(cprofile=bool(arguments.cprofile))
+
+    try:
+        if arguments.dump:
+            dump(arguments, config)
+        else:
+            run(arguments, config)
+    finally:
+        if redterm.profiler.profiler.enabled:
+            summary = redterm.profiler.profiler.summary(arguments.cprofile) + '\n' + redterm.pages.api.scheduler.summary()
+            logging.debug('Profile:\n%s', summary)
+            print(summary, file=sys.stderr)
+
+
+def search_key(terminal_io, page, search_query, key_pressed):
+    """Edit search query of saved items page by key typed. Returns new query, or None once search is done."""
+
+    if key_pressed.code in (redterm.terminal.KEY_ENTER, redterm.terminal.KEY_ESCAPE):
+        return None
+
+    if key_pressed.code in (redterm.terminal.KEY_ERASE, redterm.terminal.KEY_BACKSPACE):
+        search_query = search_query[:-1]
+    elif key_pressed and not key_pressed.is_sequence and key_pressed.isprintable():
+        search_query += key_pressed
+    else:
+        return search_query
+
+    # Search as query is typed
+    page.search(search_query)
+    terminal_io.reload()
+    return search_query
+
+
+def key_move(key_pressed):
+    """Return number of items key moves selection down by, which is 0 for keys other than movement keys."""
+
+    if key_pressed.code == redterm.terminal.KEY_DOWN or key_pressed == 'j':
+        return 1
+    if key_pressed.code == redterm.terminal.KEY_UP or key_pressed == 'k':
+        return -1
+    return 0
+
+
+def coalesce_moves(terminal_io, move):
+    """Add moves of movement keys already typed to move. Returns net move, putting back first key which is not one."""
+
+    while terminal_io.key_pending():
+        key_pressed = terminal_io.get_key(0)
+        if not key_move(key_pressed):
+            terminal_io.unget_key(key_pressed)
+            break
+        move += key_move(key_pressed)
+
+    return move
+
+
+def setup_api(arguments, config):
+    """Point pages at reddit going through local cache according to settings."""
+
+    cache = redterm.cache.Cache(DIR_CONFIG + 'cache.sqlite', config.get('cache_ttl'),
+                                config.get('cache_max_bytes', redterm.cache.MAX_BYTES))
+    scheduler = redterm.scheduler.Scheduler(config.get('rate_limit', redterm.scheduler.RATE),
+                                            config.get('rate_burst', redterm.scheduler.BURST),
+                                            config.get('request_concurrency', redterm.scheduler.CONCURRENCY))
+    redterm.pages.api = redterm.api.API(cache=cache, offline=arguments.offline, scheduler=scheduler)
+
+
+def dump(arguments, config):
+    """Write submissions of subreddit, or comments of submission, to stdout one at a time as they are fetched."""
+
+    setup_api(arguments, config)
+
+    if arguments.submission:
+        records = redterm.dump.thread(arguments.submission, arguments.limit, arguments.depth)
+    elif arguments.subreddit:
+        records = redterm.dump.listing(arguments.subreddit[0], arguments.limit)
+    else:
+        records = redterm.dump.listing('frontpage', arguments.limit, config.get('subreddits'))
+
+    if arguments.format == 'text':
+        lines = redterm.dump.text_lines(records, thread=bool(arguments.submission))
+    else:
+        lines = redterm.dump.jsonl_lines(records)
+
+    try:
+        redterm.dump.write(lines, sys.stdout)
+    except BrokenPipeError:
+        # Reader such as head stopped reading, so stop writing, and keep Python from failing to flush stdout on exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+
+def run(arguments, config):
+    """Run session until user quits."""
+
+    setup_api(arguments, config)
+    saved_store = redterm.saved.SavedStore(DIR_CONFIG + 'saved.sqlite')
+
+    terminal_io = redterm.terminal.IO(config.get('render_retain_lines', redterm.terminal.RENDER_RETAIN_LINES),
+                                      config.get('page_budget', redterm.terminal.PAGE_BUDGET),
+                                      config.get('item_budget', redterm.terminal.ITEM_BUDGET))
+    redterm.pages.wake = terminal_io.wake  # Stop waiting for keys when pages have results of background work
+    prefetch_distance = config.get('prefetch_distance', redterm.pages.PREFETCH_DISTANCE)
+    virtual = config.get('virtual_layout', False)
+
+    def build_submission_page(submission, priority):
+        """Return comment page of submission, fetching its comments with given priority."""
+
+        return redterm.pages.PageSubmission(submission, terminal_io.terminal_width,
+                                            stream=config.get('stream_comments', True),
+                                            collapse_depth=config.get('collapse_depth'),
+                                            collapse_replies=config.get('collapse_replies'),
+                                            virtual=virtual, priority=priority)
+
+    prefetcher = redterm.prefetch.Prefetcher(build_submission_page, config.get('prefetch_pages', redterm.prefetch.PREFETCH_PAGES))
+    prefetch_delay = config.get('prefetch_delay', redterm.prefetch.PREFETCH_DELAY)
 
     if arguments.subreddit:
         subreddit_title = arguments.subreddit[0]
     else:
         subreddit_title = 'frontpage'
 
-    with terminal_io.setup():
-        page = redterm.pages.PageSubreddit(subreddit_title, redterm.terminal.terminal.width)
+    with terminal_io.setup(), contextlib.closing(prefetcher):
+        with redterm.profiler.profiler.timer('phase', 'page construction'):
+            if subreddit_title == 'frontpage' and config.get('subreddits'):
+                page = redterm.pages.PageFrontpage(config['subreddits'], redterm.terminal.terminal.width, stream=True, virtual=virtual)
+            else:
+                page = redterm.pages.PageSubreddit(subreddit_title, redterm.terminal.terminal.width, stream=True, virtual=virtual)
         terminal_io.pages.append(page)
 
+        # Show page while its first items are still being fetched
+        terminal_io.status_text = 'Loading...'
+        terminal_io.render()
+        time_first_paint = time.perf_counter() - STARTED
+        redterm.profiler.profiler.record('startup', 'first paint', time_first_paint)
+        logging.debug('Time to first paint: %.1f ms, praw imported: %s', time_first_paint * 1000, 'praw' in sys.modules)
+
+        item_number = ''  # Digits typed so far, used by next g, G or % key
+        key_action = None  # First key handled since last render, timed until its result is rendered
+        key_time = 0.0
+        search_query = None  # Query being typed on saved items page, or None if not searching
+        status_message = ''  # Shown in place of status once, such as outcome of last key pressed
+        changed = True  # Whether page or selection changed since last render
+        status_rendered = None  # Status shown by last render
+        hover_item = None  # Submission cursor rests on, whose comment page is prefetched once it has rested long enough
+        hover_deadline = None  # Time at which comment page of hover_item is prefetched, or None once it is
+
         while True:
             page_current = terminal_io.pages[-1]
-            item_selected = page_current.items[page_current.item_selected]
-            terminal_io.status_text = 'Viewing.'
 
-            terminal_io.render()
+            # Merge items fetched in background, and start fetching more if nearing last item
+            with redterm.profiler.profiler.timer('phase', 'update'):
+                terminal_io.reflow_if_resized()
+                if page_current.poll():
+                    changed = True
+                if isinstance(page_current, redterm.pages.PageSubreddit):
+                    if len(page_current.items) - page_current.item_selected <= prefetch_distance:
+                        page_current.prefetch()
+
+            # Wait for first items of page, or quit if first page has none. Pages opened later may be left or searched.
+            if not page_current.items:
+                if not page_current.loading and not page_current.poll() and len(terminal_io.pages) == 1:
+                    return
+
+                if search_query is not None:
+                    terminal_io.status_text = 'Search: {} (no items found)'.format(search_query)
+                else:
+                    terminal_io.status_text = 'Loading...' if page_current.loading else 'No items.'
+                terminal_io.render()
 
-            # Controls
-            key_pressed = terminal_io.get_key(1)
+                key_pressed = terminal_io.get_key(None)
+                if search_query is not None:
+                    search_query = search_key(terminal_io, page_current, search_query, key_pressed)
+                elif key_pressed == '/' and type(page_current) is redterm.pages.PageSaved:
+                    search_query = page_current.query
+                elif key_pressed.code == redterm.terminal.KEY_BACKSPACE and len(terminal_io.pages) > 1:
+                    terminal_io.pages[-1].close()
+                    del terminal_io.pages[-1]
+                    terminal_io.reset()
+                elif key_pressed.code == redterm.terminal.KEY_ESCAPE:
+                    return
+                continue
 
-            if key_pressed.code == redterm.terminal.KEY_UP or key_pressed == 'k':
-                terminal_io.select_item_prev()
+            item_selected = page_current.items[page_current.item_selected]
+            if page_current.progress:
+                terminal_io.status_text = 'Loading... {}/{}'.format(*page_current.progress)
+            elif page_current.loading and page_current.item_selected == len(page_current.items) - 1:
+                terminal_io.status_text = 'Loading...'
+            else:
+                terminal_io.status_text = 'Viewing.'
+            if item_number:
+                terminal_io.status_text = 'Go to: ' + item_number
+            if search_query is not None:
+                terminal_io.status_text = 'Search: {} ({} found)'.format(search_query, page_current.items_total)
+            if status_message:
+                terminal_io.status_text = status_message
+                status_message = ''
+
+            # Render once all keys typed so far are handled, and only if something changed
+            if (changed or terminal_io.status_text != status_rendered) and not terminal_io.key_pending():
+                terminal_io.render()
+                changed = False
+                status_rendered = terminal_io.status_text
+                if key_action is not None:
+                    redterm.profiler.profiler.record('key', key_action, time.perf_counter() - key_time)
+                    key_action = None
+
+            # Prefetch comment page of submission once cursor has rested on it, waking up to do so if no key comes first
+            key_timeout = None
+            if isinstance(page_current, redterm.pages.PageSubreddit) and hasattr(item_selected, 'title'):
+                if item_selected is not hover_item:
+                    hover_item = item_selected
+                    hover_deadline = time.perf_counter() + prefetch_delay
+                if hover_deadline is not None:
+                    key_timeout = hover_deadline - time.perf_counter()
+                    if key_timeout <= 0:
+                        prefetcher.prefetch(item_selected)
+                        hover_deadline = None
+                        key_timeout = None
+
+            # Controls. Wait for keys, results of background work, resizing or prefetch time
+            with redterm.profiler.profiler.timer('phase', 'key read'):
+                key_pressed = terminal_io.get_key(key_timeout)
+            if not key_pressed:
+                continue
+            changed = True
+            if redterm.profiler.profiler.enabled and key_action is None:
+                key_action = key_pressed.name or str(key_pressed)
+                key_time = time.perf_counter()
+
+            # Keys typed while searching saved items go into search query
+            if search_query is not None:
+                search_query = search_key(terminal_io, page_current, search_query, key_pressed)
+                continue
+
+            # Numbers typed before g, G or % choose where to jump to
+            if key_pressed.isdigit() and not key_pressed.is_sequence:
+                item_number += key_pressed
+                continue
+            item_count = int(item_number) if item_number else None
+            item_number = ''
+
+            # Runs of movement keys make one move, so that selection keeps up with keys held down
+            if key_move(key_pressed):
+                move = coalesce_moves(terminal_io, key_move(key_pressed))
+                for step in range(abs(move)):
+                    if move > 0:
+                        terminal_io.select_item_next()
+                    else:
+                        terminal_io.select_item_prev()
+
+            elif key_pressed == 'p' and type(page_current) is redterm.pages.PageSubmission:
+                terminal_io.select_item(page_current.item_parent(page_current.item_selected))
+
+            elif key_pressed == 'n' and type(page_current) is redterm.pages.PageSubmission:
+                terminal_io.select_item(page_current.item_next_sibling(page_current.item_selected))
+
+            elif key_pressed == 'c' and type(page_current) is redterm.pages.PageSubmission:
+                page_current.toggle_collapse(page_current.item_selected)
+
+            elif key_pressed.code == redterm.terminal.KEY_HOME or key_pressed == 'g':
+                if item_count is None:
+                    terminal_io.select_item_first()
+                else:
+                    terminal_io.select_item_number(item_count)
+
+            elif key_pressed.code == redterm.terminal.KEY_END or key_pressed == 'G':
+                if item_count is None:
+                    terminal_io.select_item_last()
+                else:
+                    terminal_io.select_item_number(item_count)
+
+            elif key_pressed == '%' and item_count is not None:
+                terminal_io.select_item_percent(item_count)
 
-            elif key_pressed.code == redterm.terminal.KEY_DOWN or key_pressed == 'j':
+            elif key_pressed.code == redterm.terminal.KEY_PGUP:
+                terminal_io.select_item_prevscreen()
 
-                # If in subreddit mode, download remaining items if at last item
-                if type(page_current) is redterm.pages.PageSubreddit:
-                    if page_current.item_selected == len(page_current.items) - 1:
-                        terminal_io.status_text = 'Loading...'
-                        terminal_io.render()
+            elif key_pressed.code == redterm.terminal.KEY_PGDN:
+                terminal_io.select_item_nextscreen()
 
-                        terminal_io.pages[-1].update()
+            elif key_pressed.code == redterm.terminal.KEY_ENTER and type(page_current) is redterm.pages.PageSubmission:
+                page_current.expand_more_comments(page_current.item_selected)
 
-                        terminal_io.reset()
-                        terminal_io.status_text = 'Viewing.'
+            elif key_pressed == 'M' and type(page_current) is redterm.pages.PageSubmission:
+                page_current.expand_all_more_comments()
 
-                terminal_io.select_item_next()
+            elif key_pressed == 's' and (hasattr(item_selected, 'title') or hasattr(item_selected, 'body')):
+                if saved_store.is_saved(item_selected):
+                    saved_store.unsave(item_selected)
+                    status_message = 'Removed from saved items.'
+                else:
+                    saved_store.save(item_selected)
+                    status_message = 'Saved.'
 
-            elif key_pressed.code == redterm.terminal.KEY_PGUP:
-                terminal_io.select_item_prevscreen()
+            elif key_pressed == 'S' and type(page_current) is not redterm.pages.PageSaved:
+                terminal_io.pages.append(redterm.pages.PageSaved(saved_store, terminal_io.terminal_width, virtual=virtual))
+                terminal_io.reset()
 
-            elif key_pressed.code == redterm.terminal.KEY_PGDN:
-                terminal_io.select_item_nextscreen()
+            elif key_pressed == '/' and type(page_current) is redterm.pages.PageSaved:
+                search_query = page_current.query
 
             elif key_pressed.code == redterm.terminal.KEY_ENTER:
                 terminal_io.status_text = 'Loading...'
                 terminal_io.render()
 
                 try:
-                    new_page = redterm.pages.PageSubmission(item_selected, terminal_io.terminal_width)
+                    with redterm.profiler.profiler.timer('phase', 'page construction'):
+                        new_page = prefetcher.take(item_selected)
 
                     terminal_io.pages.append(new_page)
                     terminal_io.status_text = 'Viewing.'
@@ -110,6 +401,10 @@ def main():
                 terminal_io.render()
 
                 if len(terminal_io.pages) > 1:
+                    # Comment pages prefetched from a listing are of no use once it is closed
+                    if isinstance(terminal_io.pages[-1], redterm.pages.PageSubreddit):
+                        prefetcher.clear()
+                    terminal_io.pages[-1].close()
                     del terminal_io.pages[-1]
                     terminal_io.reset()
 
@@ -118,9 +413,6 @@ def main():
             elif key_pressed.code == redterm.terminal.KEY_ESCAPE:
                 break
 
-            elif not key_pressed:
-                pass
-
             #logging.debug(key_pressed.code)
 
 if __name__ == '__main__':
@@ -0,0 +1,250 @@
+import functools
+import itertools
+import logging
+import threading
+
+import redterm.__init__
+import redterm.profiler
+import redterm.records
+import redterm.scheduler
+
+
+SUBMISSION_FIELDS = ('id', 'name', 'title', 'url', 'permalink', 'score', 'num_comments', 'author', 'subreddit',
+                     'selftext', 'created_utc')
+COMMENT_FIELDS = ('id', 'name', 'parent_id', 'author', 'score', 'body', 'created_utc')
+MORE_COMMENTS_FIELDS = ('id', 'name', 'parent_id', 'count', 'children')
+
+LISTING_CACHE_EVERY = 25  # Write listing to cache each time this many more submissions were fetched
+LISTING_PAGE = 100        # Number of submissions reddit returns per request for a listing
+
+USER_AGENT = 'desktop:https://github.com/owlowlgo/redterm:' + redterm.__init__.__version__
+
+
+class Item:
+    """Stand-in for a PRAW object, holding fields restored from cache."""
+
+    def __init__(self, fields):
+        self.__dict__.update(fields)
+
+    def __repr__(self):
+        return '<Item {}>'.format(getattr(self, 'name', None))
+
+
+def dump_submission(submission):
+    """Return fields of submission to be cached."""
+
+    return _dump(submission, SUBMISSION_FIELDS)
+
+
+def dump_comments(comments):
+    """Return fields of comment tree to be cached."""
+
+    dumped = []
+    for comment in comments:
+        if hasattr(comment, 'body'):
+            fields = _dump(comment, COMMENT_FIELDS)
+            fields['replies'] = dump_comments(getattr(comment, 'replies', []))
+        else:
+            fields = _dump(comment, MORE_COMMENTS_FIELDS)
+        dumped.append(fields)
+
+    return dumped
+
+
+def load_comments(dumped):
+    """Return comment tree restored from cached fields."""
+
+    comments = []
+    for fields in dumped:
+        comment = Item(fields)
+        if 'replies' in fields:
+            comment.replies = load_comments(fields['replies'])
+        comments.append(comment)
+
+    return comments
+
+
+def _dump(item, fields):
+    """Return given fields of item, with non-JSON values such as Redditor objects as strings."""
+
+    dumped = {}
+    for field in fields:
+        value = getattr(item, field, None)
+        if value is not None and not isinstance(value, (str, int, float, bool, list)):
+            value = str(value)
+        dumped[field] = value
+
+    return dumped
+
+
+def create_reddit():
+    """Return new praw.Reddit. praw is only imported here, as importing it takes a good part of startup time."""
+
+    with redterm.profiler.profiler.timer('startup', 'praw'):
+        import praw
+        return praw.Reddit(user_agent=USER_AGENT)
+
+
+class API:
+    """Access to reddit, going through local cache if there is one.
+
+    Every request to reddit goes through scheduler, so that requests user is waiting on go before prefetching, and
+    all of them stay within reddit's rate limit.
+    """
+
+    def __init__(self, reddit=None, cache=None, offline=False, scheduler=None):
+        self._reddit = reddit   # praw.Reddit, or anything with the same interface. Created when first needed if None
+        self._reddit_lock = threading.Lock()
+        self.cache = cache
+        self.offline = offline  # Only serve from cache
+        self.scheduler = scheduler or redterm.scheduler.Scheduler()
+
+    @property
+    def reddit(self):
+        """Return reddit client, creating it on first use."""
+
+        if self._reddit is None:
+            with self._reddit_lock:  # Pages may first need it from several background threads at once
+                if self._reddit is None:
+                    self._reddit = create_reddit()
+        return self._reddit
+
+    def get_hot(self, subreddit_title, limit=1000, priority=redterm.scheduler.USER):
+        """Yield hot submissions of subreddit, starting with cached ones and continuing from reddit a page at a time."""
+
+        listing = []
+        if self.cache is not None:
+            listing = self.cache.get('listing', subreddit_title, stale=self.offline) or []
+
+        for fields in listing[:limit]:
+            yield Item(fields)
+
+        if self.offline or len(listing) >= limit:
+            return
+
+        params = {'after': listing[-1]['name']} if listing else {}
+        remaining = limit - len(listing)
+        submissions = self.reddit.get_subreddit(subreddit_title).get_hot(limit=remaining, params=params)
+
+        # Listing extended from cache keeps the time it was first cached, so that it still expires on time. A listing
+        # fetched anew is cached as fresh once, and then kept as such while it is extended
+        keep_created = bool(listing)
+
+        # Each page is a single request, made when submissions of previous page are used up
+        submission_no = 0
+        while submission_no < remaining:
+            page = self.scheduler.call(None, functools.partial(self._fetch_listing_page, submissions), priority)
+            for submission in page:
+                submission_no += 1
+                if self.cache is not None:
+                    listing.append(dump_submission(submission))
+                    if submission_no % LISTING_CACHE_EVERY == 0:
+                        self.cache.put('listing', subreddit_title, listing, keep_created)
+                        keep_created = True
+
+                yield submission
+
+            if len(page) < LISTING_PAGE:
+                break
+
+        if self.cache is not None:
+            self.cache.put('listing', subreddit_title, listing, keep_created)
+
+    @staticmethod
+    def _fetch_listing_page(submissions):
+        """Return next page of submissions of listing."""
+
+        with redterm.profiler.profiler.timer('network', 'get_hot'):
+            return list(itertools.islice(submissions, LISTING_PAGE))
+
+    def get_submission(self, submission_id, priority=redterm.scheduler.USER):
+        """Return submission with given id, or None if it is not cached while offline."""
+
+        if self.cache is not None:
+            dumped = self.cache.get('submission', submission_id, stale=self.offline)
+            if dumped is not None:
+                return Item(dumped['submission'])
+
+        if self.offline:
+            logging.debug('No cached submission %s', submission_id)
+            return None
+
+        return self.scheduler.call(('submission', submission_id),
+                                   functools.partial(self._fetch_submission, submission_id), priority)
+
+    def _fetch_submission(self, submission_id):
+        """Return submission with given id from reddit."""
+
+        with redterm.profiler.profiler.timer('network', 'get_submission'):
+            return self.reddit.get_submission(submission_id=submission_id)
+
+    def get_comments(self, submission, priority=redterm.scheduler.USER):
+        """Return comment tree of submission."""
+
+        if self.cache is not None:
+            dumped = self.cache.get('submission', submission.id, stale=self.offline)
+            if dumped is not None:
+                return load_comments(dumped['comments'])
+
+        if self.offline:
+            logging.debug('No cached comments for %s', submission.id)
+            return []
+
+        return self.scheduler.call(('comments', submission.id), functools.partial(self._fetch_comments, submission), priority)
+
+    def _fetch_comments(self, submission):
+        """Return comment tree of submission from reddit, caching it."""
+
+        with redterm.profiler.profiler.timer('network', 'get_comments'):
+            if isinstance(submission, (Item, redterm.records.SubmissionRecord)):
+                submission = self.reddit.get_submission(submission_id=submission.id)
+
+            comments = submission.comments
+        if self.cache is not None:
+            self.cache.put('submission', submission.id, {'submission': dump_submission(submission),
+                                                          'comments': dump_comments(comments)})
+
+        return comments
+
+    def get_more_comments(self, more_comments):
+        """Return comments which a "More comments" placeholder stands for as a flat list in display order, or None if they cannot be fetched.
+
+        Placeholder is either a PRAW object, or a redterm.records.MoreCommentsRecord which is fetched by its ids.
+        """
+
+        if self.offline or not (hasattr(more_comments, 'comments') or getattr(more_comments, 'link_id', None)):
+            logging.debug('Cannot fetch more comments for %s', getattr(more_comments, 'parent_id', None))
+            return None
+
+        # Placeholders are told apart by the comments they stand for, as ones continuing threads share an id
+        key = ('more_comments', getattr(more_comments, 'parent_id', None), tuple(getattr(more_comments, 'children', None) or ()))
+        comments_fetched = self.scheduler.call(key, functools.partial(self._fetch_more_comments, more_comments))
+
+        # Comments continuing a thread come with their replies nested, so flatten them
+        comments = []
+        stack = list(reversed(comments_fetched))
+        while stack:
+            comment = stack.pop()
+            comments.append(comment)
+            stack.extend(reversed(getattr(comment, 'replies', None) or []))
+
+        return comments
+
+    def _fetch_more_comments(self, more_comments):
+        """Return comments which a "More comments" placeholder stands for from reddit, with their replies nested."""
+
+        with redterm.profiler.profiler.timer('network', 'get_more_comments'):
+            if hasattr(more_comments, 'comments'):
+                return more_comments.comments() or []
+
+            if more_comments.children:
+                response = self.reddit.request_json(self.reddit.config['morechildren'],
+                                                     data={'children': ','.join(more_comments.children),
+                                                           'link_id': more_comments.link_id,
+                                                           'r': more_comments.subreddit})
+                return response['data']['things']
+
+            # "Continue this thread" placeholder, whose comments are the replies on the page of its parent comment
+            thread = self.reddit.get_submission('https://www.reddit.com/comments/{}/_/{}'.format(
+                more_comments.link_id[3:], more_comments.parent_id[3:]))
+            return getattr(thread.comments[0], 'replies', []) if thread.comments else []
@@ -1,9 +1,10 @@
 import logging
 import os
-import webbrowser
 
 
 def open_browser(browser, url):
+    import webbrowser  # Only needed once a browser is opened, so kept out of startup
+
     if browser == 'lynx':
         b = webbrowser.get('lynx')
     else:
@@ -0,0 +1,88 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+
+TTL = {'listing': 5 * 60,       # Seconds cached payloads are considered fresh, by kind of payload
+       'submission': 30 * 60}
+MAX_BYTES = 64 * 1024 * 1024    # Size of cache at which least recently used payloads start getting evicted
+
+
+class Cache:
+    """On-disk cache of JSON payloads with expiry by kind of payload, and least recently used eviction."""
+
+    def __init__(self, path, ttl=None, max_bytes=MAX_BYTES):
+        self.ttl = dict(TTL, **(ttl or {}))
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()  # Cache is shared with threads fetching in background
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS cache ('
+                                 'kind TEXT, key TEXT, value TEXT, size INTEGER, created REAL, accessed REAL, '
+                                 'PRIMARY KEY (kind, key))')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+        self._connection.commit()
+
+    def get(self, kind, key, stale=False):
+        """Return cached payload, or None if there is none or it has expired. Expired payloads are returned if stale is True."""
+
+        with self._lock:
+            row = self._connection.execute('SELECT value, created FROM cache WHERE kind = ? AND key = ?', (kind, key)).fetchone()
+
+            if row is None or (not stale and time.time() - row[1] > self.ttl.get(kind, 0)):
+                self.misses += 1
+                return None
+
+            self._connection.execute('UPDATE cache SET accessed = ? WHERE kind = ? AND key = ?', (time.time(), kind, key))
+            self._connection.commit()
+            self.hits += 1
+
+        return json.loads(row[0])
+
+    def put(self, kind, key, value, keep_created=False):
+        """Store payload, then evict least recently used payloads if cache is over its size limit.
+
+        If keep_created is True, a payload already cached under key keeps the time it was created, so that extending it
+        does not make it fresh again.
+        """
+
+        value = json.dumps(value)
+        now = time.time()
+
+        with self._lock:
+            if keep_created:
+                self._connection.execute('INSERT INTO cache VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (kind, key) DO UPDATE SET '
+                                         'value = excluded.value, size = excluded.size, accessed = excluded.accessed',
+                                         (kind, key, value, len(value), now, now))
+            else:
+                self._connection.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)', (kind, key, value, len(value), now, now))
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        """Delete least recently used payloads until cache fits in self.max_bytes."""
+
+        size = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+        if size <= self.max_bytes:
+            return
+
+        evicted = []
+        for kind, key, item_size in self._connection.execute('SELECT kind, key, size FROM cache ORDER BY accessed'):
+            if size <= self.max_bytes:
+                break
+            evicted.append((kind, key))
+            size -= item_size
+
+        self._connection.executemany('DELETE FROM cache WHERE kind = ? AND key = ?', evicted)
+        logging.debug('Evicted %d payloads from cache', len(evicted))
+
+    def close(self):
+        """Close cache database."""
+
+        with self._lock:
+            self._connection.close()
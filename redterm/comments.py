@@ -0,0 +1,163 @@
+def walk(comments, max_depth=None):
+    """Yield (comment, depth) of comments and their replies in display order, with depth as CommentTree gives it.
+
+    Replies of comments at max_depth are left out, if it is given. Unlike CommentTree, nothing is kept of comments
+    already yielded, only an iterator over remaining replies for each level.
+    """
+
+    stack = [iter(comments)]
+    while stack:
+        depth = len(stack) - 1
+        for comment in stack[-1]:
+            yield comment, depth
+
+            replies = getattr(comment, 'replies', None)
+            if replies and (max_depth is None or depth < max_depth):
+                stack.append(iter(replies))
+                break
+
+        else:
+            stack.pop()
+
+
+class CommentNode:
+    """Position of a comment within a comment tree."""
+
+    __slots__ = ('comment', 'index', 'parent', 'depth', 'end', 'reply_count')
+
+    def __init__(self, comment, index, parent, depth):
+        self.comment = comment
+        self.index = index    # Index of comment in display order
+        self.parent = parent  # Parent node, or None for top level comments
+        self.depth = depth    # 0 for top level comments
+        self.end = None       # Index following last comment of subtree
+        self.reply_count = 0  # Number of direct replies
+
+    @property
+    def size(self):
+        """Return number of comments in subtree, including this comment."""
+
+        return self.end - self.index
+
+
+class CommentTree:
+    """Index of a comment tree in display order, built in a single pass.
+
+    The subtree of a comment occupies the index range [node.index, node.end), so depth, parent, subtree size and next
+    sibling lookups are all O(1).
+    """
+
+    def __init__(self, comments=()):
+        self.nodes = []          # Nodes in display order
+        self.nodes_by_id = {}    # Nodes by comment id
+
+        self.extend(comments)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def extend(self, comments, parent=None, replies_of=None):
+        """Add comments with their replies after last node, below parent node or at top level if parent is None.
+
+        Replies are taken from comment.replies, or from replies_of(comment) if given.
+        """
+
+        nodes = self.nodes
+        nodes_by_id = self.nodes_by_id
+
+        # Walk tree depth first, keeping an iterator over remaining replies for each level
+        stack = [(iter(comments), parent, 0 if parent is None else parent.depth + 1)]
+        while stack:
+            replies, reply_parent, reply_depth = stack[-1]
+            for comment in replies:
+                node = CommentNode(comment, len(nodes), reply_parent, reply_depth)
+                nodes.append(node)
+
+                comment_id = getattr(comment, 'id', None)
+                if comment_id is not None:
+                    nodes_by_id[comment_id] = node
+
+                comment_replies = getattr(comment, 'replies', None) if replies_of is None else replies_of(comment)
+                if comment_replies:
+                    node.reply_count = len(comment_replies)
+                    stack.append((iter(comment_replies), node, reply_depth + 1))
+                    break
+                node.end = len(nodes)
+
+            else:
+                # All replies on this level are done, which completes subtree of their parent
+                stack.pop()
+                if stack:
+                    reply_parent.end = len(nodes)
+
+    def splice(self, index, comments):
+        """Replace node at index, such as a "More comments" placeholder, with comments. Returns new nodes.
+
+        Comments are a flat list in display order, and are placed below each other according to their parent_id.
+        Comments replying to none of the others take the place of the replaced node.
+        """
+
+        node_replaced = self.nodes[index]
+
+        # Group replies by parent, keeping their order
+        comment_ids = {getattr(comment, 'id', None) for comment in comments}
+        replies_by_parent_id = {}
+        comments_top = []
+        for comment in comments:
+            parent_id = (getattr(comment, 'parent_id', None) or '')[3:]
+            if parent_id in comment_ids:
+                replies_by_parent_id.setdefault(parent_id, []).append(comment)
+            else:
+                comments_top.append(comment)
+
+        spliced = CommentTree()
+        spliced.extend(comments_top, node_replaced.parent, lambda comment: replies_by_parent_id.get(getattr(comment, 'id', None)))
+
+        for node in spliced.nodes:
+            node.index += index
+            node.end += index
+        self.nodes[index:index + 1] = spliced.nodes
+
+        # Move nodes after spliced nodes, and grow subtrees containing them
+        shift = len(spliced.nodes) - 1
+        if shift:
+            for node in self.nodes[index + len(spliced.nodes):]:
+                node.index += shift
+                node.end += shift
+
+            ancestor = node_replaced.parent
+            while ancestor is not None:
+                ancestor.end += shift
+                ancestor = ancestor.parent
+
+        if node_replaced.parent is not None:
+            node_replaced.parent.reply_count += len(comments_top) - 1
+
+        if self.nodes_by_id.get(getattr(node_replaced.comment, 'id', None)) is node_replaced:
+            del self.nodes_by_id[node_replaced.comment.id]
+        self.nodes_by_id.update(spliced.nodes_by_id)
+
+        return spliced.nodes
+
+    def depth(self, index):
+        """Return depth of comment at index."""
+
+        return self.nodes[index].depth
+
+    def parent(self, index):
+        """Return index of parent of comment at index, or None for top level comments."""
+
+        parent = self.nodes[index].parent
+        return None if parent is None else parent.index
+
+    def next_sibling(self, index):
+        """Return index of next comment with same parent as comment at index, or None if there is none."""
+
+        node = self.nodes[index]
+        if node.end < len(self.nodes) and self.nodes[node.end].parent is node.parent:
+            return node.end
+        return None
+
@@ -0,0 +1,85 @@
+import concurrent.futures
+import itertools
+import json
+
+import redterm.comments
+import redterm.pages
+import redterm.records
+
+
+KINDS = {redterm.records.SubmissionRecord: 'submission',  # Kind written with fields of each record
+         redterm.records.CommentRecord: 'comment',
+         redterm.records.MoreCommentsRecord: 'more_comments'}
+LISTING_LIMIT = 1000  # Number of submissions listing goes up to if no limit is given, as on subreddit pages
+
+
+def listing(subreddit_title, limit=None, frontpage_titles=None):
+    """Yield records of hot submissions of subreddit, or of subreddits in frontpage_titles merged as on frontpage."""
+
+    executor = None
+    if frontpage_titles:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=redterm.pages.FRONTPAGE_WORKERS)
+        submissions = redterm.pages.merge_hot(frontpage_titles, executor)
+    else:
+        submissions = redterm.pages.api.get_hot(subreddit_title, limit=limit or LISTING_LIMIT)
+
+    try:
+        for submission in itertools.islice(submissions, limit):
+            yield redterm.records.submission_record(submission)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def thread(submission_id, limit=None, max_depth=None):
+    """Yield record of submission, then records of up to limit of its comments in display order.
+
+    Replies of comments at max_depth are left out, if it is given, with depth counted from 0 for top level comments.
+    """
+
+    submission = redterm.pages.api.get_submission(submission_id)
+    if submission is None:
+        return
+
+    submission_record = redterm.records.submission_record(submission)
+    yield submission_record
+
+    comments = redterm.comments.walk(redterm.pages.api.get_comments(submission), max_depth)
+    for comment, depth in itertools.islice(comments, limit):
+        yield redterm.records.comment_record(comment, depth, submission_record)
+
+
+def jsonl_lines(records):
+    """Yield each record as a line of JSON with its kind and fields."""
+
+    for record in records:
+        fields = {'kind': KINDS[type(record)]}
+        fields.update((field, getattr(record, field)) for field in type(record).__slots__)
+        yield json.dumps(fields) + '\n'
+
+
+def text_lines(records, thread=False):
+    """Yield each record as plain text, formatted as pages display it and indented by its depth.
+
+    Submissions are numbered as in a listing, or shown as the head of their comments if thread is True.
+    """
+
+    for item_no, record in enumerate(records, 1):
+        indentation = ''
+        if type(record) is not redterm.records.SubmissionRecord:
+            text = redterm.pages.PageSubmission._format_comment(record)
+            indentation = '  ' * record.depth
+        elif thread:
+            text = redterm.pages.PageSubmission._format_header(record)
+        else:
+            text = redterm.pages.PageSubreddit._format_submission(item_no, record)
+
+        yield ''.join(indentation + line + '\n' for line in text.text.splitlines()) + '\n'
+
+
+def write(lines, stream):
+    """Write lines to stream, flushing each one so that readers get it as soon as it is made."""
+
+    for line in lines:
+        stream.write(line)
+        stream.flush()
@@ -0,0 +1,94 @@
+class LineIndex:
+    """Line locations of items on a page, kept as prefix sums of item heights in a Fenwick tree.
+
+    Behaves like the list of item locations it replaces, but changing the height of an item and finding the item on a
+    given line both take O(log n) instead of O(n).
+    """
+
+    def __init__(self, heights=()):
+        self.heights = list(heights)  # Number of lines taken up by each item
+        self._build()
+
+    def _build(self):
+        """Build tree from self.heights in O(n)."""
+
+        self._tree = [0] + self.heights
+        for index in range(1, len(self._tree)):
+            parent = index + (index & -index)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[index]
+
+    def __len__(self):
+        return len(self.heights)
+
+    def __getitem__(self, item_no):
+        """Return line location of item."""
+
+        if item_no < 0:
+            item_no += len(self.heights)
+        if not 0 <= item_no < len(self.heights):
+            raise IndexError('item index out of range')
+
+        return self._prefix(item_no)
+
+    def _prefix(self, item_count):
+        """Return total height of first item_count items."""
+
+        total = 0
+        while item_count > 0:
+            total += self._tree[item_count]
+            item_count &= item_count - 1
+        return total
+
+    @property
+    def total(self):
+        """Return total number of lines."""
+
+        return self._prefix(len(self.heights))
+
+    def append(self, height):
+        """Add item to end."""
+
+        self.heights.append(height)
+        index = len(self.heights)
+
+        # Node covers heights (index - lowest bit, index], all of which except the new one are already in tree
+        self._tree.append(height + self._prefix(index - 1) - self._prefix(index - (index & -index)))
+
+    def set(self, item_no, height):
+        """Change height of item."""
+
+        delta = height - self.heights[item_no]
+        if not delta:
+            return
+
+        self.heights[item_no] = height
+        index = item_no + 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def replace(self, item_start, item_end, heights):
+        """Replace items from item_start up to item_end with items of given heights, rebuilding tree in O(n)."""
+
+        self.heights[item_start:item_end] = heights
+        self._build()
+
+    def find(self, line):
+        """Return index of item on given line, or of last item if line is below all items."""
+
+        if not self.heights:
+            raise IndexError('no items')
+
+        # Descend tree for the largest item count whose total height is at most line
+        item_count = 0
+        remaining = line
+        step = 1 << (len(self.heights).bit_length())
+        while step:
+            index = item_count + step
+            if index < len(self._tree) and self._tree[index] <= remaining:
+                item_count = index
+                remaining -= self._tree[index]
+            step >>= 1
+
+        return min(item_count, len(self.heights) - 1)
@@ -1,23 +1,120 @@
+import bisect
+import concurrent.futures
+import heapq
+import itertools
 import logging
+import math
+import os
+import pickle
+import queue
 import re
-from urllib.parse import urlparse
+import threading
+import zlib
 
-import blessed
-import praw
+import redterm.api
+import redterm.comments
+import redterm.layout
+import redterm.records
+import redterm.scheduler
+import redterm.text
 
-import redterm.__init__
 
-
-terminal = blessed.Terminal()
-reddit_api = praw.Reddit(user_agent='desktop:https://github.com/owlowlgo/redterm:' + redterm.__init__.__version__)  # TODO Add version
+styles = redterm.text.styles  # Makes text of items in styles, which are turned into escape sequences once drawn
+api = redterm.api.API()  # Replaced on startup with one using local cache according to settings. Creates praw.Reddit on first use
 
 LIMIT = 25  # TODO put this in config file
+PREFETCH_DISTANCE = 10  # Start fetching next batch of items when cursor is this close to last item
+COMMENTS_FIRST_CHUNK = 30  # Number of comments to show before the rest of a thread is loaded
+COMMENTS_CHUNK = 250  # Number of comments loaded in background at a time
+MORE_COMMENTS_WORKERS = 4  # Number of "More comments" placeholders expanded at the same time
+FRONTPAGE_WORKERS = 8  # Number of subreddits fetched at the same time for frontpage
+LINE_STYLE = 'bold_white_on_black'  # Style of lines of page, which styles of parts of item text are added to
+FRONTPAGE_TIMEOUT = 5  # Seconds frontpage waits for a subreddit before going on without it until it arrives
+HOT_RANK_SECONDS = 45000  # Difference in age of submissions which outweighs a tenfold difference in score
+
+
+def wake():
+    """Called from background threads once they have results for poll(). Replaced on startup to wake up main loop."""
+
+    pass
+
+
+def hot_rank(submission):
+    """Return rank of submission by score and age, like the one reddit orders hot submissions by."""
+
+    score = getattr(submission, 'score', 0) or 0
+    sign = (score > 0) - (score < 0)
+    return sign * math.log10(max(abs(score), 1)) + (getattr(submission, 'created_utc', 0) or 0) / HOT_RANK_SECONDS
+
+
+def fetch_chunk(submissions):
+    """Return next LIMIT submissions of listing. Runs in thread pool."""
+
+    return list(itertools.islice(submissions, LIMIT))
+
+
+def merge_hot(subreddit_titles, executor):
+    """Yield hot submissions of all subreddits, highest hot_rank() first.
+
+    Listings are fetched a chunk at a time, each from executor's thread pool, and a subreddit's next chunk is only fetched
+    once the merge used up its previous one. Subreddits which take longer than FRONTPAGE_TIMEOUT are left out of the
+    merge until their chunk arrives, and ones which fail are left out for good.
+    """
+
+    listings = {}
+    fetches = {}                # Future of next chunk of each subreddit being fetched
+    for subreddit_title in subreddit_titles:
+        listings[subreddit_title] = api.get_hot(subreddit_title, limit=1000)
+        fetches[subreddit_title] = executor.submit(fetch_chunk, listings[subreddit_title])
+
+    heap = []                   # Next submission of each subreddit, as (-rank, order, subreddit, chunk, index in chunk)
+    order = itertools.count()   # Keeps submissions of equal rank in order they were fetched
+    waiting = list(fetches)     # Subreddits whose chunk is needed before merge can go on
+
+    while True:
+        if waiting:
+            concurrent.futures.wait([fetches[subreddit_title] for subreddit_title in waiting], timeout=FRONTPAGE_TIMEOUT)
+            waiting = []
+
+        # Add chunks which arrived to merge, including late ones of subreddits which were left out
+        for subreddit_title, future in list(fetches.items()):
+            if not future.done():
+                continue
+            del fetches[subreddit_title]
+
+            try:
+                chunk = future.result()
+            except Exception:
+                logging.exception('Failed to fetch /r/%s for frontpage', subreddit_title)
+                continue
+
+            if chunk:
+                heapq.heappush(heap, (-hot_rank(chunk[0]), next(order), subreddit_title, chunk, 0))
+
+        if not heap:
+            if not fetches:
+                return
+            waiting = list(fetches)
+            continue
+
+        rank, order_no, subreddit_title, chunk, index = heapq.heappop(heap)
+        yield chunk[index]
+
+        if index + 1 < len(chunk):
+            heapq.heappush(heap, (-hot_rank(chunk[index + 1]), next(order), subreddit_title, chunk, index + 1))
+        elif len(chunk) == LIMIT:
+            fetches[subreddit_title] = executor.submit(fetch_chunk, listings[subreddit_title])
+            waiting.append(subreddit_title)
 
 
 class PageBase:
     """Base class for how items are to be displayed and selected."""
 
-    def __init__(self, name, width, indent=2):
+    # Attributes holding items and their layout, which are written to disk while page is spilled
+    SPILL_FIELDS = ('items', 'item_strings', '_item_strings_formatted', 'item_onscreenlocs', 'item_indentations',
+                    'items_hidden', 'layout_patches', '_layout_strings', '_item_heights_exact')
+
+    def __init__(self, name, width, indent=2, virtual=False):
         self.name = name
         self.items = []                    # Items to be displayed on page, such as Submission and Comment objects
         self.item_strings = []             # Actual text to be displayed
@@ -25,52 +122,308 @@ class PageBase:
         self.item_onscreenlocs = []        # Index of locations of items in the buffer
         self._item_selected = 0            # Currently selected item
         self.item_indentations = []        # Index of indentation level of items
+        self.items_hidden = set()          # Indexes of items which are not displayed, such as replies to collapsed comments
+        self.layout_patches = []           # Changes to formatted lines made in place, as (first line, lines replaced, new lines)
+
+        self._layout_cache = {}            # Wrapped lines of each item, keyed by (item string, width, indentation)
+        self._layout_strings = []          # Item strings which are currently laid out in self._item_strings_formatted
+        self._layout_width = None          # Width used for current layout
 
         self.width = width                 # Width of page
         self.indent = indent               # Indent page by this value
 
+        # In virtual mode, item_onscreenlocs is a LineIndex of estimated item heights, and items are only laid out
+        # when displayed. Formatted lines are then fetched with self.lines() instead of self.item_strings_formatted.
+        self.virtual = virtual
+        self._item_heights_exact = []      # Whether height of each item in LineIndex is exact, in virtual mode
+        if virtual:
+            self.item_onscreenlocs = redterm.layout.LineIndex()
+
+        self.spilled = None                # Path of file items are spilled to, while they are not held in memory
+
     @property
     def item_strings_formatted(self):
         """Process items to display to be wrapped according to current terminal size."""
 
-        #if self._item_strings_formatted and self.width == terminal.width:
-        #    return self._item_strings_formatted
-
-        # Reset current wrapped item info
-        self._item_strings_formatted = []
-        self.item_onscreenlocs = []
+        # Start over if page width changed or already laid out items were altered, otherwise only lay out new items
+        item_count = len(self.item_onscreenlocs)
+        if self.width != self._layout_width or self.item_strings[:item_count] != self._layout_strings:
+            self._item_strings_formatted = []
+            self.item_onscreenlocs = []
+            self._layout_strings = []
+            self._layout_width = self.width
 
-        # Take each item to display by line, and break it into multiple lines based of current terminal width
-        line_no = 0
-        for item_no, item_display in enumerate(self.item_strings):
-            # Confirm indentation level for each item
-            try:
-                item_indentation = self.item_indentations[item_no] * 2
-            except IndexError:
-                item_indentation = 0
-            finally:
-                indentation = self.indent + item_indentation
-
-            # Save location of each new broken down line
-            self.item_onscreenlocs.append(line_no)
-            for item_display_line in item_display.splitlines():
-                item_width = self.width - indentation - 1 # Width of item is width of page, minus item indentation, and minus an extra character for the trailing '│' symbol
-                for line in terminal.wrap(item_display_line, item_width):
-                    if indentation > 1:
-                        line = terminal.bold_white_on_black(' ' * indentation + '│' + line)
-                    else:
-                        line = terminal.bold_white_on_black(' ' * indentation + line)
-
-                    self._item_strings_formatted.append(line)
-                    line_no += 1
-
-            # Add extra blank line under item
-            line = terminal.bold_white_on_black(' ' * self.width)
-            self._item_strings_formatted.append(line)
-            line_no += 1
+        # Save location of each new item, then add its lines
+        for item_no in range(len(self.item_onscreenlocs), len(self.item_strings)):
+            self.item_onscreenlocs.append(len(self._item_strings_formatted))
+            self._item_strings_formatted.extend(self._layout_item(item_no))
+            self._layout_strings.append(self.item_strings[item_no])
 
         return self._item_strings_formatted
 
+    def relayout(self, item_start, item_end):
+        """Lay out items from item_start up to item_end again, patching formatted lines and item_onscreenlocs in place.
+
+        Returns (first line, number of lines replaced, new lines), or None if items have not been laid out yet.
+        """
+
+        item_end = min(item_end, len(self.item_onscreenlocs))
+        if self.width != self._layout_width or item_start >= item_end:
+            return None
+
+        if self.virtual:
+            for item_no in range(item_start, item_end):
+                self.item_onscreenlocs.set(item_no, self._estimate_item_height(item_no))
+                self._item_heights_exact[item_no] = False
+            return None
+
+        return self._patch_layout(item_start, item_end, item_end)
+
+    def replace_items(self, item_start, item_end, items, item_strings, item_indentations, hidden=False):
+        """Replace items from item_start up to item_end, laying out only the new items if page is laid out already.
+
+        New items are hidden if hidden is True. Returns patch of formatted lines like self.relayout() does, or None if
+        replaced items were not laid out yet.
+        """
+
+        item_shift = len(items) - (item_end - item_start)
+
+        self.items[item_start:item_end] = items
+        self.item_strings[item_start:item_end] = item_strings
+        self.item_indentations[item_start:item_end] = item_indentations
+        self.items_hidden = {item_no + item_shift if item_no >= item_end else item_no
+                             for item_no in self.items_hidden if not item_start <= item_no < item_end}
+        if hidden:
+            self.items_hidden.update(range(item_start, item_start + len(items)))
+        if item_start < self._item_selected < item_end:
+            self._item_selected = item_start
+        elif self._item_selected >= item_end:
+            self._item_selected += item_shift
+
+        if self.width != self._layout_width or item_end > len(self.item_onscreenlocs):
+            return None
+
+        if self.virtual:
+            item_numbers = range(item_start, item_start + len(items))
+            self.item_onscreenlocs.replace(item_start, item_end, [self._estimate_item_height(item_no) for item_no in item_numbers])
+            self._item_heights_exact[item_start:item_end] = [False] * len(items)
+            return None
+
+        return self._patch_layout(item_start, item_end, item_start + len(items))
+
+    def _patch_layout(self, item_start, item_end_old, item_end_new):
+        """Replace layout of items from item_start up to item_end_old with layout of items up to item_end_new."""
+
+        line_start = self.item_onscreenlocs[item_start]
+        try:
+            line_end = self.item_onscreenlocs[item_end_old]
+        except IndexError:
+            line_end = len(self._item_strings_formatted)
+
+        lines = []
+        item_onscreenlocs = []
+        for item_no in range(item_start, item_end_new):
+            item_onscreenlocs.append(line_start + len(lines))
+            lines.extend(self._layout_item(item_no))
+
+        self._item_strings_formatted[line_start:line_end] = lines
+        self._layout_strings[item_start:item_end_old] = self.item_strings[item_start:item_end_new]
+        self.item_onscreenlocs[item_start:item_end_old] = item_onscreenlocs
+
+        # Move items below patched items by difference in number of lines
+        line_shift = len(lines) - (line_end - line_start)
+        if line_shift:
+            for item_no in range(item_end_new, len(self.item_onscreenlocs)):
+                self.item_onscreenlocs[item_no] += line_shift
+
+        patch = line_start, line_end - line_start, lines
+        self.layout_patches.append(patch)
+        return patch
+
+    def sync_layout(self):
+        """Add estimated heights of new items to LineIndex, or estimate all of them again if page width changed.
+
+        Used in virtual mode only, where this is all the layout done up front.
+        """
+
+        if self.width != self._layout_width:
+            self._layout_width = self.width
+            self.item_onscreenlocs = redterm.layout.LineIndex(self._estimate_item_height(item_no) for item_no in range(len(self.item_strings)))
+            self._item_heights_exact = [False] * len(self.item_strings)
+
+        for item_no in range(len(self.item_onscreenlocs), len(self.item_strings)):
+            self.item_onscreenlocs.append(self._estimate_item_height(item_no))
+            self._item_heights_exact.append(False)
+
+    def layout_items(self, item_start, item_end):
+        """Lay out items from item_start up to item_end, correcting their estimated heights. Used in virtual mode only."""
+
+        for item_no in range(max(item_start, 0), min(item_end, len(self.item_onscreenlocs))):
+            if not self._item_heights_exact[item_no]:
+                self.item_onscreenlocs.set(item_no, len(self._layout_item(item_no)))
+                self._item_heights_exact[item_no] = True
+
+    def lines(self, line_start, line_count):
+        """Return formatted lines from line_start, laying out only items which are needed. Used in virtual mode only."""
+
+        lines = []
+        if not len(self.item_onscreenlocs):
+            return lines
+
+        item_no = self.item_onscreenlocs.find(line_start)
+        line_skip = line_start - self.item_onscreenlocs[item_no]
+        while len(lines) < line_skip + line_count and item_no < len(self.item_onscreenlocs):
+            self.layout_items(item_no, item_no + 1)
+            lines.extend(self._layout_item(item_no))
+            item_no += 1
+
+        return lines[max(line_skip, 0):line_skip + line_count]
+
+    def item_at_line(self, line):
+        """Return index of item on line, or closest to it."""
+
+        if self.virtual:
+            return self.item_onscreenlocs.find(line)
+
+        # Item locations are sorted, so compare the items directly above and below line
+        item_no = bisect.bisect_left(self.item_onscreenlocs, line)
+        if item_no == len(self.item_onscreenlocs):
+            return item_no - 1
+        if item_no > 0 and line - self.item_onscreenlocs[item_no - 1] <= self.item_onscreenlocs[item_no] - line:
+            return bisect.bisect_left(self.item_onscreenlocs, self.item_onscreenlocs[item_no - 1])
+        return item_no
+
+    @property
+    def line_count(self):
+        """Return number of lines of laid out items."""
+
+        if self.virtual:
+            return self.item_onscreenlocs.total
+
+        return len(self._item_strings_formatted)
+
+    def _item_indentation(self, item_no):
+        """Return number of columns item is indented by."""
+
+        try:
+            return self.indent + self.item_indentations[item_no] * 2
+        except IndexError:
+            return self.indent
+
+    def _estimate_item_height(self, item_no):
+        """Return number of lines item is likely to take up when laid out, without wrapping it."""
+
+        if item_no in self.items_hidden:
+            return 0
+
+        indentation = self._item_indentation(item_no)
+        item_display = self.item_strings[item_no]
+        try:
+            return len(self._layout_cache[(item_display, self.width, indentation)])
+        except KeyError:
+            pass
+
+        # Wide characters make this underestimate
+        item_width = max(self.width - indentation - 1, 1)
+        return sum(len(item_display_line) // item_width + 1 for item_display_line in item_display.text.splitlines()) + 1
+
+    def _layout_item(self, item_no):
+        """Return item broken into multiple lines based of current page width, reusing previous results if possible."""
+
+        # Hidden items take up no lines
+        if item_no in self.items_hidden:
+            return []
+
+        indentation = self._item_indentation(item_no)
+
+        item_display = self.item_strings[item_no]
+        layout_key = (item_display, self.width, indentation)
+        try:
+            return self._layout_cache[layout_key]
+        except KeyError:
+            pass
+
+        lines = []
+        for item_display_line in item_display.splitlines():
+            item_width = self.width - indentation - 1 # Width of item is width of page, minus item indentation, and minus an extra character for the trailing '│' symbol
+            for line in item_display_line.wrap(item_width):
+                if indentation > 1:
+                    line = redterm.text.StyledText(' ' * indentation + '│', style=LINE_STYLE) + line
+                else:
+                    line = redterm.text.StyledText(' ' * indentation, style=LINE_STYLE) + line
+
+                lines.append(line)
+
+        # Add extra blank line under item
+        lines.append(redterm.text.StyledText(' ' * self.width, style=LINE_STYLE))
+
+        self._layout_cache[layout_key] = lines
+        return lines
+
+    def item_next(self, item_no):
+        """Return index of next displayed item after item."""
+
+        return item_no + 1
+
+    def item_prev(self, item_no):
+        """Return index of previous displayed item before item."""
+
+        return item_no - 1
+
+    def item_visible(self, item_no):
+        """Return index of displayed item which takes the place of item on screen, which is item itself if displayed."""
+
+        return item_no
+
+    @property
+    def loading(self):
+        """Return whether items are being fetched in background."""
+
+        return False
+
+    @property
+    def progress(self):
+        """Return (loaded, total) count of items while page is being loaded in background, otherwise None."""
+
+        return None
+
+    def poll(self):
+        """Merge results of background work into page. Return True if page changed."""
+
+        return False
+
+    def close(self):
+        """Stop any background work of page."""
+
+        pass
+
+    def spill(self, path):
+        """Write items and layout of page to path, and drop them from memory until rehydrate() is called.
+
+        Selection and everything needed to keep fetching items stay in memory. Layout cache is dropped rather than
+        written, as it only speeds up laying out at other widths.
+        """
+
+        state = {field: getattr(self, field) for field in self.SPILL_FIELDS}
+        with open(path, 'wb') as file:
+            file.write(zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL), 1))
+
+        for field in self.SPILL_FIELDS:
+            setattr(self, field, None)
+        self._layout_cache = {}
+        self.spilled = path
+
+    def rehydrate(self):
+        """Read items and layout of page back from disk after spill()."""
+
+        with open(self.spilled, 'rb') as file:
+            state = pickle.loads(zlib.decompress(file.read()))
+
+        for field, value in state.items():
+            setattr(self, field, value)
+        os.remove(self.spilled)
+        self.spilled = None
+
     @property
     def item_selected(self):
         """Return currently selected item index."""
@@ -88,99 +441,535 @@ class PageBase:
 class PageSubreddit(PageBase):
     """Holds information on how to display subreddit."""
 
-    def __init__(self, subreddit_title, width, indent=2):
+    def __init__(self, subreddit_title, width, indent=2, submissions=None, stream=False, virtual=False):
         self.subreddit_title = subreddit_title
 
-        PageBase.__init__(self, '/r/' + self.subreddit_title, width, indent=2)
+        PageBase.__init__(self, '/r/' + self.subreddit_title, width, indent=2, virtual=virtual)
 
-        self.submissions = reddit_api.get_subreddit(self.subreddit_title).get_hot(limit=1000)
+        if submissions is None:
+            submissions = api.get_hot(self.subreddit_title, limit=1000)
+        self.submissions = submissions
 
-        for i in range(LIMIT):
-            self.items.append(next(self.submissions))
+        self._batches = queue.Queue()  # Batches of items fetched in background, waiting to be merged
+        self._fetcher = None           # Thread fetching next batch
+        self._fetching = False         # Whether next batch is being fetched, cleared just after batch is handed over
+        self._exhausted = False        # Whether all items have been fetched
 
-        self.prepare_text()
+        # Either fetch first batch in background so that page can be shown right away, or fetch it now
+        if stream:
+            self.prefetch()
+        else:
+            self.update()
 
     def prepare_text(self):
-        """pass"""
+        """Build display text for items which do not have any yet."""
+
+        for item_no, item in enumerate(self.items[len(self.item_strings):], len(self.item_strings) + 1):
+            self.item_strings.append(self._format_submission(item_no, item))
 
-        self.item_strings = []
-        for item_no, item in enumerate(self.items, 1):
-            self.item_strings.append(terminal.bold_white_on_black(str(item_no) + '. ') +
-                                     terminal.bold_white_on_black(str(item.title) + ' (') +
-                                     terminal.blue_on_black('{uri.netloc}'.format(uri=urlparse(item.url))) + terminal.bold_white_on_black(')') + '\n' +
-                                     terminal.bold_white_on_black(str(item.score) + 'pts ') +
-                                     terminal.bold_white_on_black(str(item.num_comments) + ' comments by ') +
-                                     terminal.cyan_on_black(str(item.author)) + terminal.bold_white_on_black(' ') +
-                                     terminal.cyan_on_black('/r/' + str(item.subreddit)) + '\n')
+    @staticmethod
+    def _record(item):
+        """Return record of item to keep in page, so that PRAW objects fetched for page can be dropped."""
+
+        return redterm.records.submission_record(item)
+
+    @staticmethod
+    def _format_submission(item_no, item):
+        """Return text to display for submission numbered item_no."""
+
+        return (styles.bold_white_on_black(str(item_no) + '. ') +
+                styles.bold_white_on_black(str(item.title) + ' (') +
+                styles.blue_on_black(item.netloc) + styles.bold_white_on_black(')') + '\n' +
+                styles.bold_white_on_black(str(item.score) + 'pts ') +
+                styles.bold_white_on_black(str(item.num_comments) + ' comments by ') +
+                styles.cyan_on_black(str(item.author)) + styles.bold_white_on_black(' ') +
+                styles.cyan_on_black('/r/' + str(item.subreddit)) + '\n')
 
     def update(self):
-        """pass"""
+        """Fetch next batch of items, blocking until done."""
+
+        self.prefetch()
+        if self._fetcher is not None:
+            self._fetcher.join()
+        self.poll()
 
+    def prefetch(self):
+        """Start fetching next batch of items in background, unless already fetching."""
+
+        if self.loading or self._exhausted or not self._batches.empty():
+            return
+
+        self._fetching = True
+        self._fetcher = threading.Thread(target=self._fetch_batch, daemon=True)
+        self._fetcher.start()
+
+    def _fetch_batch(self):
+        """Fetch next batch of items. Runs in background thread."""
+
+        batch = []
         for i in range(LIMIT):
             try:
-                self.items.append(next(self.submissions))
+                batch.append(self._record(next(self.submissions)))
             except StopIteration:
-                pass
+                self._exhausted = True
+                break
+            except Exception:
+                logging.exception('Failed to fetch items for %s', self.name)
+                break
+
+        # Hand batch over before clearing flag, so that page is never seen as neither loading nor having a batch
+        self._batches.put(batch)
+        self._fetching = False
+        wake()
 
-        self.prepare_text()
+    @property
+    def loading(self):
+        """Return whether items are being fetched in background."""
 
+        return self._fetching
 
-    #derivatives = ('on', 'bright', 'on_bright',)
-    #colors = set('black red green yellow blue magenta cyan white'.split())
+    def poll(self):
+        """Merge batches fetched in background into page. Return True if page changed."""
 
-class PageSubmission(PageBase):
-    """Holds information on how to display a submission along with comments."""
+        changed = False
+        while True:
+            try:
+                batch = self._batches.get_nowait()
+            except queue.Empty:
+                break
 
-    def __init__(self, submission, width, indent=2):
-        PageBase.__init__(self, '/r/' + str(submission.subreddit) + '/' + submission.title, width, indent=2)
+            if batch:
+                self.items.extend(batch)
+                changed = True
 
-        self.submission = submission
+        if changed:
+            self.prepare_text()
 
-        self.item_strings.append(terminal.bold(str(self.submission.title)) + '(' +
-                                 terminal.underline_blue('{uri.netloc}'.format(uri=urlparse(self.submission.url))) + ')\n' +
-                                 str(self.submission.score) + 'pts ' +
-                                 str(self.submission.num_comments) + ' comments by (' +
-                                 terminal.underline_cyan(str(self.submission.author)) + ')' +
-                                 str(re.sub('\n\s*\n', '\n\n', self.submission.selftext)) + '\n')
+        return changed
 
-        for comment in praw.helpers.flatten_tree(submission.comments):
-            self.items.append(comment)
 
-        self.item_indentations = self._get_comment_depth(self.submission, self.items)
+class PageFrontpage(PageSubreddit):
+    """Holds information on how to display hot submissions of several subreddits merged into one page."""
 
-        for item_no, item in enumerate(self.items):
-            try:
-                self.item_strings.append(terminal.white_on_black('* ') + terminal.cyan_on_black(str(item.author)) + ' ' +
-                                         str(item.score) + 'pts \n' +
+    def __init__(self, subreddit_titles, width, indent=2, stream=False, virtual=False):
+        self.subreddit_titles = list(subreddit_titles)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=FRONTPAGE_WORKERS)
+
+        PageSubreddit.__init__(self, 'frontpage', width, indent, merge_hot(self.subreddit_titles, self._executor),
+                               stream, virtual)
+        self.name = 'frontpage'
+
+    def close(self):
+        """Stop fetching subreddits."""
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class PageSaved(PageSubreddit):
+    """Holds information on how to display submissions and comments saved locally, and search through them.
+
+    Saved items are read from store a batch at a time as the page is scrolled, like submissions of a subreddit.
+    """
+
+    def __init__(self, store, width, indent=2, query='', stream=False, virtual=False):
+        self.store = store                     # redterm.saved.SavedStore
+        self.query = query                     # Search query items match
+        self.items_total = store.count(query)  # Number of saved items matching query
+
+        PageSubreddit.__init__(self, 'saved', width, indent, store.items(query), stream, virtual)
+        self.name = 'saved'
+
+    @staticmethod
+    def _record(item):
+        """Return record of saved submission or comment."""
+
+        if item.kind == 'comment':
+            return redterm.records.CommentRecord(item)
+        return redterm.records.SubmissionRecord(item)
+
+    def prepare_text(self):
+        """Build display text for items which do not have any yet."""
+
+        for item_no, item in enumerate(self.items[len(self.item_strings):], len(self.item_strings) + 1):
+            if type(item) is redterm.records.CommentRecord:
+                self.item_strings.append(styles.bold_white_on_black(str(item_no) + '. ') +
+                                         styles.cyan_on_black(str(item.author)) + ' ' +
+                                         styles.bold_white_on_black(str(item.score) + 'pts ') +
+                                         styles.cyan_on_black('/r/' + str(item.subreddit)) + '\n' +
                                          str(item.body) + '\n')
+            else:
+                self.item_strings.append(self._format_submission(item_no, item))
+
+    def search(self, query):
+        """Replace items with saved items matching query."""
+
+        # Drop items of previous query still being fetched
+        if self._fetcher is not None:
+            self._fetcher.join()
+        while not self._batches.empty():
+            self._batches.get_nowait()
 
-            except AttributeError:
-                self.item_strings.append('* ' + terminal.underline_blue('More comments...'))
+        self.query = query
+        self.items_total = self.store.count(query)
+        if self.items:
+            self.replace_items(0, len(self.items), [], [], [])
+        self.submissions = self.store.items(query)
+        self._exhausted = False
 
-        self.items = [self.submission] + self.items  # TODO This is ugly. Need refactor.
+        self.update()
+
+
+    #derivatives = ('on', 'bright', 'on_bright',)
+    #colors = set('black red green yellow blue magenta cyan white'.split())
+
+class PageSubmission(PageBase):
+    """Holds information on how to display a submission along with comments."""
+
+    SPILL_FIELDS = PageBase.SPILL_FIELDS + ('comment_tree', 'items_collapsed')
+
+    def __init__(self, submission, width, indent=2, stream=True, collapse_depth=None, collapse_replies=None, virtual=False,
+                 priority=redterm.scheduler.USER):
+        PageBase.__init__(self, '/r/' + str(submission.subreddit) + '/' + submission.title, width, indent=2, virtual=virtual)
+
+        self.submission = redterm.records.submission_record(submission)
+        self._submission_source = submission      # Object to fetch comments from, dropped once they are loaded
+        self.collapse_depth = collapse_depth      # Collapse comments at this depth, if not None
+        self.collapse_replies = collapse_replies  # Collapse comments with more direct replies than this, if not None
+        self.priority = priority                  # Priority of fetching comments, such as redterm.scheduler.PREFETCH
+
+        self.items.append(self.submission)
+        self.item_indentations.append(0)
+        self.item_strings.append(self._format_header(self.submission))
+
+        self.comment_tree = None             # Index of comments in display order, once comments are fetched
+        self.items_collapsed = set()         # Indexes of items whose replies are hidden
+
+        self._chunks = queue.Queue()         # Chunks of comments formatted in background, waiting to be merged
+        self._comments_total = None          # Number of comments in thread, once known
+        self._comments_loaded = 0            # Number of comments merged into page
+        self._cancelled = threading.Event()  # Set to stop loading comments
+        self._more_comments = {}             # Fetches of comments for "More comments" items, by CommentNode of item
+        self._more_comments_executor = None  # Thread pool for above, created when first needed
+
+        # Either load comments in background while showing what is available, or load all of them now
+        if stream:
+            self._loader = threading.Thread(target=self._load_comments, daemon=True)
+            self._loader.start()
+        else:
+            self._loader = None
+            self._load_comments()
+            self.poll()
 
     def update(self):
         """pass"""
         pass
 
+    def _load_comments(self):
+        """Index comment tree and format comments in chunks, handing each chunk over to self.poll()."""
+
+        chunk_start = 0
+        try:
+            comment_tree = redterm.comments.CommentTree(api.get_comments(self._submission_source, self.priority))
+            self._submission_source = None
+            self._make_records(comment_tree.nodes)
+            self.comment_tree = comment_tree
+            self._comments_total = len(self.comment_tree)
+
+            # Comments below collapsed comments are not formatted, as they are not displayed
+            collapsed = set()
+            hidden = set()
+
+            chunk_size = COMMENTS_FIRST_CHUNK
+            while chunk_start < len(self.comment_tree) and not self._cancelled.is_set():
+                chunk = self.comment_tree.nodes[chunk_start:chunk_start + chunk_size]
+                chunk_collapsed = []
+                chunk_strings = []
+                for node in chunk:
+                    if node.parent is not None and (node.parent.index in collapsed or node.parent.index in hidden):
+                        hidden.add(node.index)
+                        chunk_collapsed.append(False)
+                        chunk_strings.append(None)
+                        continue
+
+                    node_collapsed = node.size > 1 and (
+                        (self.collapse_depth is not None and node.depth >= self.collapse_depth) or
+                        (self.collapse_replies is not None and node.reply_count > self.collapse_replies))
+                    if node_collapsed:
+                        collapsed.add(node.index)
+                    chunk_collapsed.append(node_collapsed)
+                    chunk_strings.append(self._format_comment(node.comment, node.size - 1 if node_collapsed else 0))
+
+                self._chunks.put(([node.comment for node in chunk], [node.depth for node in chunk], chunk_collapsed, chunk_strings))
+                wake()
+
+                chunk_start += chunk_size
+                chunk_size = COMMENTS_CHUNK
+
+        except Exception:
+            logging.exception('Failed to load comments for %s', self.name)
+            self._comments_total = chunk_start
+
+        finally:
+            wake()
+
+    def prebuild(self):
+        """Wait for comments to load, then merge and lay them out, so that page shows them as soon as it is opened.
+
+        Runs in a background thread before page is shown, as nothing else may use page meanwhile.
+        """
+
+        if self._loader is not None:
+            self._loader.join()
+        self.poll()
+        if not self.virtual:
+            self.item_strings_formatted
+
     @staticmethod
-    def _get_comment_depth(submission, comments):
-        """pass"""
+    def _format_header(submission):
+        """Return text to display for submission above its comments."""
+
+        return (styles.bold(str(submission.title)) + '(' + styles.underline_blue(submission.netloc) + ')\n' +
+                str(submission.score) + 'pts ' +
+                str(submission.num_comments) + ' comments by (' +
+                styles.underline_cyan(str(submission.author)) + ')' +
+                str(re.sub('\n\s*\n', '\n\n', submission.selftext)) + '\n')
+
+    @staticmethod
+    def _format_comment(comment, replies_hidden=0):
+        """Return text to display for comment, noting number of replies hidden if it is collapsed."""
+
+        try:
+            return (styles.white_on_black('* ') + styles.cyan_on_black(str(comment.author)) + ' ' +
+                    str(comment.score) + 'pts ' +
+                    (styles.underline_blue('[+{} replies]'.format(replies_hidden)) if replies_hidden else '') + '\n' +
+                    str(comment.body) + '\n')
+
+        except AttributeError:
+            return '* ' + styles.underline_blue('More comments...')
+
+    @property
+    def loading(self):
+        """Return whether comments are being loaded in background."""
+
+        return self._streaming or bool(self._more_comments)
+
+    @property
+    def _streaming(self):
+        """Return whether comment tree is still being loaded."""
+
+        return self._comments_total is None or self._comments_loaded < self._comments_total
+
+    @property
+    def progress(self):
+        """Return (loaded, total) count of comments while comments are being loaded."""
 
-        comment_depth = [0]
-        comment_indentation_depth = 0
-        comment_indentation_depth_ids = [submission.id]
+        if not self._streaming:
+            return None
 
-        for comment in comments:
-            if comment.parent_id[3:] in comment_indentation_depth_ids:
-                comment_indentation_depth = comment_indentation_depth_ids.index(comment.parent_id[3:])
-                comment_indentation_depth_ids = comment_indentation_depth_ids[0:comment_indentation_depth + 1]
+        return self._comments_loaded, self._comments_total or 0
 
+    def poll(self):
+        """Merge chunks of comments loaded in background into page. Return True if page changed."""
+
+        changed = False
+        while True:
+            try:
+                comments, comment_depths, comments_collapsed, comment_strings = self._chunks.get_nowait()
+            except queue.Empty:
+                break
+
+            for comment, comment_depth, comment_collapsed, comment_string in zip(comments, comment_depths, comments_collapsed, comment_strings):
+                item_no = len(self.items)
+                if comment_collapsed:
+                    self.items_collapsed.add(item_no)
+
+                # Hide replies to collapsed items, including items collapsed while comments are still loading
+                item_parent = self.item_parent(item_no)
+                if item_parent in self.items_collapsed or item_parent in self.items_hidden:
+                    self.items_hidden.add(item_no)
+                elif comment_string is None:
+                    comment_string = self._format_item(item_no)
+
+                self.items.append(comment)
+                self.item_indentations.append(comment_depth)
+                self.item_strings.append(comment_string)
+
+            self._comments_loaded += len(comments)
+            changed = True
+
+        # Splice in comments of "More comments" items which are done fetching
+        for node, future in list(self._more_comments.items()):
+            if not future.done():
+                continue
+
+            del self._more_comments[node]
+            try:
+                comments = future.result()
+            except Exception:
+                logging.exception('Failed to fetch more comments for %s', self.name)
+                comments = None
+
+            if comments is None:
+                self.item_strings[node.index + 1] = self._format_item(node.index + 1)
+                self.relayout(node.index + 1, node.index + 2)
             else:
-                comment_indentation_depth += 1
-                comment_indentation_depth_ids.append(comment.parent_id[3:])
+                self._splice_more_comments(node, comments)
+            changed = True
+
+        return changed
+
+    def _splice_more_comments(self, node, comments):
+        """Replace "More comments" item with comments, formatting and laying out only the new comments."""
+
+        item_no = node.index + 1
+        hidden = item_no in self.items_hidden
+
+        nodes = self.comment_tree.splice(node.index, comments)
+        self._make_records(nodes)
+
+        item_shift = len(nodes) - 1
+        self.items_collapsed = {item_collapsed + item_shift if item_collapsed > item_no else item_collapsed
+                                for item_collapsed in self.items_collapsed}
+        self._comments_loaded += item_shift
+        self._comments_total += item_shift
+
+        self.replace_items(item_no, item_no + 1,
+                           [node.comment for node in nodes],
+                           [None if hidden else self._format_comment(node.comment) for node in nodes],
+                           [node.depth for node in nodes],
+                           hidden)
+
+        # Collapsed comments above show how many replies they hide, which grew by the new comments
+        ancestor = node.parent
+        while ancestor is not None:
+            if ancestor.index + 1 in self.items_collapsed and ancestor.index + 1 not in self.items_hidden:
+                self.item_strings[ancestor.index + 1] = self._format_item(ancestor.index + 1)
+                self.relayout(ancestor.index + 1, ancestor.index + 2)
+            ancestor = ancestor.parent
+
+    def _make_records(self, nodes):
+        """Replace comments of nodes with records, so that PRAW objects fetched for them can be dropped."""
+
+        for node in nodes:
+            node.comment = redterm.records.comment_record(node.comment, node.depth, self.submission)
+
+    def item_is_more_comments(self, item_no):
+        """Return whether item is a "More comments" placeholder."""
+
+        return item_no > 0 and not hasattr(self.items[item_no], 'body')
+
+    def expand_more_comments(self, item_no):
+        """Start fetching comments which "More comments" item stands for in background, to be merged by self.poll()."""
+
+        if self._streaming or not self.item_is_more_comments(item_no):
+            return
+
+        node = self.comment_tree.nodes[item_no - 1]
+        if node in self._more_comments:
+            return
+
+        if self._more_comments_executor is None:
+            self._more_comments_executor = concurrent.futures.ThreadPoolExecutor(MORE_COMMENTS_WORKERS)
+        self._more_comments[node] = self._more_comments_executor.submit(api.get_more_comments, node.comment)
+        self._more_comments[node].add_done_callback(lambda future: wake())
+
+        self.item_strings[item_no] = self._format_item(item_no)
+        self.relayout(item_no, item_no + 1)
+
+    def expand_all_more_comments(self):
+        """Start fetching comments of all "More comments" items, at most MORE_COMMENTS_WORKERS at a time."""
+
+        if self._streaming:
+            return
+
+        for item_no in range(1, len(self.items)):
+            if self.item_is_more_comments(item_no):
+                self.expand_more_comments(item_no)
+
+    def _format_item(self, item_no):
+        """Return text to display for comment item."""
+
+        node = self.comment_tree.nodes[item_no - 1]
+        if node in self._more_comments:
+            return '* ' + styles.underline_blue('Loading more comments...')
+        return self._format_comment(node.comment, node.size - 1 if item_no in self.items_collapsed else 0)
+
+    def toggle_collapse(self, item_no):
+        """Collapse or expand replies of item. Returns patch of formatted lines as PageBase.relayout() does."""
+
+        if item_no == 0 or self.comment_tree is None or self.comment_tree.nodes[item_no - 1].size == 1:
+            return None
+
+        subtree_end = min(self.comment_tree.nodes[item_no - 1].end + 1, len(self.items))
+
+        if item_no in self.items_collapsed:
+            self.items_collapsed.discard(item_no)
+
+            # Show replies, except for replies to replies which are collapsed themselves
+            reply_no = item_no + 1
+            while reply_no < subtree_end:
+                self.items_hidden.discard(reply_no)
+                if self.item_strings[reply_no] is None:
+                    self.item_strings[reply_no] = self._format_item(reply_no)
+
+                if reply_no in self.items_collapsed:
+                    reply_no = self.comment_tree.nodes[reply_no - 1].end + 1
+                else:
+                    reply_no += 1
+
+        else:
+            self.items_collapsed.add(item_no)
+            self.items_hidden.update(range(item_no + 1, subtree_end))
+
+        self.item_strings[item_no] = self._format_item(item_no)
+
+        return self.relayout(item_no, subtree_end)
+
+    def item_next(self, item_no):
+        """Return index of next displayed item after item, skipping replies of collapsed items."""
+
+        if item_no in self.items_collapsed:
+            return self.comment_tree.nodes[item_no - 1].end + 1
+        return item_no + 1
+
+    def item_prev(self, item_no):
+        """Return index of previous displayed item before item, skipping replies of collapsed items."""
+
+        return self.item_visible(item_no - 1)
+
+    def item_visible(self, item_no):
+        """Return index of outermost collapsed item containing item, or item itself if it is displayed."""
+
+        while item_no in self.items_hidden:
+            item_no = self.item_parent(item_no)
+
+        return item_no
+
+    def close(self):
+        """Stop loading comments."""
+
+        self._cancelled.set()
+
+        # Python waits for fetches left in thread pool before it exits, so drop those which have not started
+        if self._more_comments_executor is not None:
+            self._more_comments_executor.shutdown(wait=False, cancel_futures=True)
+
+    def item_parent(self, item_no):
+        """Return index of item which item is a reply to, or None if there is none."""
+
+        if item_no == 0 or self.comment_tree is None:
+            return None
+
+        comment_parent = self.comment_tree.parent(item_no - 1)
+        return 0 if comment_parent is None else comment_parent + 1
 
-            comment_depth.append(comment_indentation_depth)
+    def item_next_sibling(self, item_no):
+        """Return index of next item replying to same item as item, or None if there is none loaded."""
 
-        return comment_depth
+        if item_no == 0 or self.comment_tree is None:
+            return None
 
+        comment_sibling = self.comment_tree.next_sibling(item_no - 1)
+        if comment_sibling is None or comment_sibling + 1 >= len(self.items):
+            return None
+        return comment_sibling + 1
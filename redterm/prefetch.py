@@ -0,0 +1,102 @@
+import collections
+import concurrent.futures
+import logging
+import time
+
+import redterm.profiler
+import redterm.scheduler
+
+
+PREFETCH_DELAY = 0.5  # Default seconds cursor rests on a submission before its comment page is built in background
+PREFETCH_PAGES = 3    # Default number of comment pages built ahead of being opened which are kept
+PREFETCH_WORKERS = 2  # Number of comment pages built at the same time
+
+
+def _close_page(future):
+    """Close page built by future, unless building it failed."""
+
+    if future.exception() is None:
+        future.result().close()
+
+
+class Prefetcher:
+    """Comment pages of submissions built in background before they are opened, least recently prefetched dropped first.
+
+    Pages which drop out are closed, stopping them from loading comments. Counts of opened submissions whose page was
+    prefetched or not are kept in hits and misses.
+    """
+
+    def __init__(self, build, capacity=PREFETCH_PAGES, workers=PREFETCH_WORKERS):
+        self._build = build                      # Returns comment page of submission, fetching comments with given priority
+        self.capacity = capacity
+        self._pages = collections.OrderedDict()  # (future of page, time prefetched) by submission id, oldest first
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+        self.hits = 0
+        self.misses = 0
+
+    def prefetch(self, submission):
+        """Start building comment page of submission in background, unless it is already built or being built."""
+
+        if not self.capacity:
+            return
+
+        if submission.id in self._pages:
+            self._pages.move_to_end(submission.id)
+            return
+
+        self._pages[submission.id] = (self._executor.submit(self._prebuild, submission), time.perf_counter())
+        while len(self._pages) > self.capacity:
+            self._discard(self._pages.popitem(last=False)[1][0])
+
+    def _prebuild(self, submission):
+        """Return comment page of submission with its comments loaded and laid out. Runs in thread pool."""
+
+        page = self._build(submission, redterm.scheduler.PREFETCH)
+        page.prebuild()
+        return page
+
+    def take(self, submission):
+        """Return comment page of submission, which is the prefetched one if it is built and a new one otherwise.
+
+        A prefetched page still being built is dropped. The new page shares its request for comments, which then goes
+        ahead of other prefetching.
+        """
+
+        future, time_prefetched = self._pages.pop(submission.id, (None, None))
+        if future is not None and not future.done():
+            self._discard(future)
+        elif future is not None:
+            try:
+                page = future.result()
+            except Exception:
+                logging.exception('Failed to prefetch comments of %s', submission.id)
+            else:
+                self.hits += 1
+                redterm.profiler.profiler.record('prefetch', 'hit', time.perf_counter() - time_prefetched)
+                return page
+
+        with redterm.profiler.profiler.timer('prefetch', 'miss'):
+            page = self._build(submission, redterm.scheduler.USER)
+        self.misses += 1
+        return page
+
+    def clear(self):
+        """Drop all prefetched pages, such as once the listing they were prefetched from is closed."""
+
+        while self._pages:
+            self._discard(self._pages.popitem()[1][0])
+
+    def close(self):
+        """Drop all prefetched pages, and stop building any."""
+
+        self.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logging.debug('Opened comment pages prefetched: %d, not prefetched: %d', self.hits, self.misses)
+
+    @staticmethod
+    def _discard(future):
+        """Cancel building page, or close page once it is built if building already started."""
+
+        if not future.cancel():
+            future.add_done_callback(_close_page)
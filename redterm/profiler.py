@@ -0,0 +1,120 @@
+import bisect
+import contextlib
+import io
+import threading
+import time
+
+
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)  # Upper bounds of histogram buckets in milliseconds
+CPROFILE_TOP = 30                                                  # Number of functions listed in cProfile summary
+
+
+class Histogram:
+    """Counts of durations falling into each of BUCKETS, plus one bucket for anything longer."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0  # Sum of durations in seconds
+        self.max = 0.0
+
+    def add(self, seconds):
+        """Count a duration."""
+
+        self.counts[bisect.bisect_left(BUCKETS, seconds * 1000)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent):
+        """Return upper bound in milliseconds of bucket holding given percentile, or max duration for last bucket."""
+
+        rank = self.count * percent / 100
+        seen = 0
+        for bucket_no, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return BUCKETS[bucket_no] if bucket_no < len(BUCKETS) else self.max * 1000
+        return 0
+
+    def summary(self):
+        """Return one line summary."""
+
+        return '{:>7} {:>9.1f} {:>7.0f}ms {:>7.0f}ms {:>9.1f}ms  {}'.format(
+            self.count, self.total * 1000, self.percentile(50), self.percentile(95), self.max * 1000,
+            ' '.join('{}:{}'.format('<' + str(bound) if bucket_no < len(BUCKETS) else '>' + str(BUCKETS[-1]), count)
+                     for bucket_no, (bound, count) in enumerate(zip(BUCKETS + (None,), self.counts)) if count))
+
+
+class Profiler:
+    """Latency histograms of main loop phases, key actions and network calls.
+
+    Does nothing until enabled, so that timing calls can stay in hot paths. Histograms are keyed by a category and a
+    name, such as ('phase', 'render'), ('key', 'j') or ('network', 'get_comments').
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+        self._lock = threading.Lock()  # Network calls are timed from background threads
+        self._cprofile = None
+
+    def enable(self, cprofile=False):
+        """Start collecting timings, and run cProfile as well if cprofile is True."""
+
+        self.enabled = True
+        if cprofile:
+            import cProfile  # Imported here, as it is rarely used and slows down startup
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def record(self, category, name, seconds):
+        """Add duration to histogram of category and name."""
+
+        if not self.enabled:
+            return
+
+        with self._lock:
+            histogram = self.histograms.get((category, name))
+            if histogram is None:
+                histogram = self.histograms[(category, name)] = Histogram()
+            histogram.add(seconds)
+
+    def timer(self, category, name):
+        """Return context manager timing the code it wraps."""
+
+        if not self.enabled:
+            return _NULL_TIMER
+        return self._timer(category, name)
+
+    @contextlib.contextmanager
+    def _timer(self, category, name):
+        time_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(category, name, time.perf_counter() - time_start)
+
+    def summary(self, cprofile_path=None):
+        """Return report of all histograms, and of cProfile if it was run. cProfile stats are saved to cprofile_path if given."""
+
+        lines = ['{:<32}{:>7} {:>9} {:>9} {:>9} {:>11}  {}'.format('', 'count', 'total ms', 'p50', 'p95', 'max', 'buckets')]
+        for category, name in sorted(self.histograms):
+            lines.append('{:<32}'.format((category + ' ' + name)[:31]) + self.histograms[(category, name)].summary())
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            if cprofile_path:
+                self._cprofile.dump_stats(cprofile_path)
+
+            import pstats
+            output = io.StringIO()
+            pstats.Stats(self._cprofile, stream=output).sort_stats('cumulative').print_stats(CPROFILE_TOP)
+            lines.append(output.getvalue())
+
+        return '\n'.join(lines)
+
+
+_NULL_TIMER = contextlib.nullcontext()  # Returned by Profiler.timer() while disabled
+
+profiler = Profiler()  # Shared by all modules, enabled on startup with --profile
@@ -0,0 +1,93 @@
+from urllib.parse import urlparse
+
+
+def _plain(value):
+    """Return value as is if it is a plain value, otherwise as a string, such as the name of a Redditor object."""
+
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+class SubmissionRecord:
+    """Fields of a submission which pages display, copied out of a PRAW object or cached Item so that it can be dropped."""
+
+    __slots__ = ('id', 'name', 'title', 'url', 'netloc', 'permalink', 'score', 'num_comments', 'author', 'subreddit',
+                 'selftext', 'created_utc')
+
+    def __init__(self, submission):
+        self.id = submission.id
+        self.name = getattr(submission, 'name', None)
+        self.title = submission.title
+        self.url = getattr(submission, 'url', None) or ''
+        self.netloc = urlparse(self.url).netloc
+        self.permalink = getattr(submission, 'permalink', None)
+        self.score = getattr(submission, 'score', None)
+        self.num_comments = getattr(submission, 'num_comments', None)
+        self.author = _plain(getattr(submission, 'author', None))
+        self.subreddit = _plain(getattr(submission, 'subreddit', None))
+        self.selftext = getattr(submission, 'selftext', None) or ''
+        self.created_utc = getattr(submission, 'created_utc', None)
+
+    def __repr__(self):
+        return '<SubmissionRecord {}>'.format(self.name)
+
+
+class CommentRecord:
+    """Fields of a comment which pages display, and which saving it needs. Submission and subreddit comment belongs to
+    are taken from submission if given, otherwise from comment itself.
+    """
+
+    __slots__ = ('id', 'name', 'parent_id', 'depth', 'author', 'score', 'body', 'created_utc', 'subreddit', 'link_id')
+
+    def __init__(self, comment, depth=0, submission=None):
+        self.id = comment.id
+        self.name = getattr(comment, 'name', None)
+        self.parent_id = getattr(comment, 'parent_id', None)
+        self.depth = depth
+        self.author = _plain(getattr(comment, 'author', None))
+        self.score = getattr(comment, 'score', None)
+        self.body = comment.body
+        self.created_utc = getattr(comment, 'created_utc', None)
+        self.link_id = getattr(submission, 'name', None) or getattr(comment, 'link_id', None)
+        self.subreddit = _plain(getattr(submission, 'subreddit', None) or getattr(comment, 'subreddit', None))
+
+    def __repr__(self):
+        return '<CommentRecord {}>'.format(self.name)
+
+
+class MoreCommentsRecord:
+    """Fields of a "More comments" placeholder needed to fetch the comments it stands for."""
+
+    __slots__ = ('id', 'name', 'parent_id', 'depth', 'count', 'children', 'link_id', 'subreddit')
+
+    def __init__(self, more_comments, depth=0, submission=None):
+        self.id = getattr(more_comments, 'id', None)
+        self.name = getattr(more_comments, 'name', None)
+        self.parent_id = getattr(more_comments, 'parent_id', None)
+        self.depth = depth
+        self.count = getattr(more_comments, 'count', 0)
+        self.children = tuple(getattr(more_comments, 'children', None) or ())
+        self.link_id = getattr(submission, 'name', None)      # Submission the comments belong to
+        self.subreddit = _plain(getattr(submission, 'subreddit', None))
+
+    def __repr__(self):
+        return '<MoreCommentsRecord {}>'.format(self.name)
+
+
+def comment_record(comment, depth=0, submission=None):
+    """Return record of comment or "More comments" placeholder at given depth of comment tree of submission."""
+
+    if isinstance(comment, (CommentRecord, MoreCommentsRecord)):
+        return comment
+    if hasattr(comment, 'body'):
+        return CommentRecord(comment, depth, submission)
+    return MoreCommentsRecord(comment, depth, submission)
+
+
+def submission_record(submission):
+    """Return record of submission, which is submission itself if it is a record already."""
+
+    if isinstance(submission, SubmissionRecord):
+        return submission
+    return SubmissionRecord(submission)
@@ -0,0 +1,135 @@
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+import redterm.api
+
+
+SAVED_SUBMISSION_FIELDS = redterm.api.SUBMISSION_FIELDS
+SAVED_COMMENT_FIELDS = redterm.api.COMMENT_FIELDS + ('link_id', 'subreddit')
+CHUNK = 100  # Number of saved items read from database at a time
+
+
+class SavedStore:
+    """Submissions and comments saved locally, with a full-text index over their text.
+
+    Items are listed most recently saved first, and read from the database a chunk at a time, so that listing and
+    searching stay fast however many items are saved. As saving an item again replaces it, ids follow order of saving,
+    which lets searches walk the full-text index in id order instead of sorting all matches.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()  # Store is read by threads fetching pages in background
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS saved ('
+                                 'id INTEGER PRIMARY KEY, name TEXT UNIQUE, kind TEXT, fields TEXT, '
+                                 'title TEXT, body TEXT, author TEXT, subreddit TEXT, saved REAL)')
+
+        # Keep full-text index in step with table, if SQLite comes with FTS5. Otherwise searches scan the table.
+        try:
+            self._connection.execute('CREATE VIRTUAL TABLE IF NOT EXISTS saved_fts USING fts5('
+                                     'title, body, author, subreddit, content=saved, content_rowid=id)')
+            self._connection.execute('CREATE TRIGGER IF NOT EXISTS saved_insert AFTER INSERT ON saved BEGIN '
+                                     'INSERT INTO saved_fts (rowid, title, body, author, subreddit) '
+                                     'VALUES (new.id, new.title, new.body, new.author, new.subreddit); END')
+            self._connection.execute('CREATE TRIGGER IF NOT EXISTS saved_delete AFTER DELETE ON saved BEGIN '
+                                     'INSERT INTO saved_fts (saved_fts, rowid, title, body, author, subreddit) '
+                                     "VALUES ('delete', old.id, old.title, old.body, old.author, old.subreddit); END")
+            self.fts = True
+        except sqlite3.OperationalError:
+            logging.debug('SQLite has no FTS5, searching saved items without index')
+            self.fts = False
+
+        self._connection.commit()
+
+    def save(self, item):
+        """Save submission or comment, replacing it if it is already saved."""
+
+        kind = 'comment' if hasattr(item, 'body') else 'submission'
+        fields = redterm.api._dump(item, SAVED_COMMENT_FIELDS if kind == 'comment' else SAVED_SUBMISSION_FIELDS)
+
+        with self._lock:
+            self._connection.execute('DELETE FROM saved WHERE name = ?', (fields['name'],))
+            self._connection.execute('INSERT INTO saved (name, kind, fields, title, body, author, subreddit, saved) '
+                                     'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                     (fields['name'], kind, json.dumps(fields), fields.get('title') or '',
+                                      fields.get('body') or fields.get('selftext') or '', fields['author'] or '',
+                                      fields['subreddit'] or '', time.time()))
+            self._connection.commit()
+
+    def unsave(self, item):
+        """Remove item from saved items."""
+
+        with self._lock:
+            self._connection.execute('DELETE FROM saved WHERE name = ?', (getattr(item, 'name', None),))
+            self._connection.commit()
+
+    def is_saved(self, item):
+        """Return whether item is saved."""
+
+        with self._lock:
+            return self._connection.execute('SELECT 1 FROM saved WHERE name = ?',
+                                            (getattr(item, 'name', None),)).fetchone() is not None
+
+    def count(self, query=''):
+        """Return number of saved items matching query."""
+
+        where, parameters = self._match(query)
+        if self.fts and where:
+            select = 'SELECT COUNT(*) FROM saved_fts WHERE ' + where
+        else:
+            select = 'SELECT COUNT(*) FROM saved WHERE ' + (where or '1')
+
+        with self._lock:
+            return self._connection.execute(select, parameters).fetchone()[0]
+
+    def items(self, query=''):
+        """Yield saved items matching query as redterm.api.Item, most recently saved first, reading CHUNK at a time."""
+
+        where, parameters = self._match(query)
+        if self.fts and where:
+            select = ('SELECT saved.id, saved.kind, saved.fields FROM saved_fts JOIN saved ON saved.id = saved_fts.rowid'
+                      ' WHERE saved_fts MATCH ? AND saved_fts.rowid < ? ORDER BY saved_fts.rowid DESC LIMIT ?')
+        else:
+            select = ('SELECT saved.id, saved.kind, saved.fields FROM saved WHERE ' + (where or '1') +
+                      ' AND saved.id < ? ORDER BY saved.id DESC LIMIT ?')
+
+        after = 1 << 62  # Id of last item read, from which next chunk continues
+        while True:
+            with self._lock:
+                rows = self._connection.execute(select, parameters + [after, CHUNK]).fetchall()
+
+            for row_id, kind, fields in rows:
+                item = redterm.api.Item(json.loads(fields))
+                item.kind = kind
+                yield item
+
+            if len(rows) < CHUNK:
+                return
+            after = rows[-1][0]
+
+    def _match(self, query):
+        """Return condition and its parameters matching items which contain all words of query as prefixes.
+
+        With FTS5 the condition is a MATCH expression on saved_fts, otherwise it is a scan of the saved table.
+        """
+
+        words = re.findall(r'\w+', query)
+        if not words:
+            return '', []
+
+        if self.fts:
+            return 'saved_fts MATCH ?', [' '.join('"{}"*'.format(word) for word in words)]
+
+        clauses = ' AND '.join("(saved.title || ' ' || saved.body || ' ' || saved.author || ' ' || saved.subreddit) LIKE ?"
+                               for word in words)
+        return clauses, ['%{}%'.format(word) for word in words]
+
+    def close(self):
+        """Close database."""
+
+        with self._lock:
+            self._connection.close()
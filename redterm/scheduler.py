@@ -0,0 +1,156 @@
+import heapq
+import itertools
+import threading
+import time
+
+import redterm.profiler
+
+
+# Priorities of requests, lower ones going first
+USER = 0                                 # Requests for what user is waiting on
+PREFETCH = 1                             # Requests for what user may want next
+PRIORITY_NAMES = ('user', 'prefetch')
+
+RATE = 1.0        # Default number of requests per second, as reddit allows 60 requests a minute
+BURST = 10        # Default number of requests which may go at once after a quiet spell
+CONCURRENCY = 4   # Default number of requests running at the same time
+
+
+class Request:
+    """Call of a function in Scheduler, and its outcome once done."""
+
+    __slots__ = ('key', 'priority', 'order', 'started', 'done', 'result', 'error')
+
+    def __init__(self, key, priority, order):
+        self.key = key
+        self.priority = priority
+        self.order = order       # Requests of equal priority go in order they were made
+        self.started = False
+        self.done = False
+        self.result = None
+        self.error = None        # Exception function raised, if any
+
+    def outcome(self):
+        """Return result of function, or raise exception it raised."""
+
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class Scheduler:
+    """Single queue all network requests go through, run highest priority first within a rate budget.
+
+    Requests are run by threads making them, once it is their turn. A token bucket refilled at rate tokens per second,
+    holding up to burst tokens, lets a request go for each token. Requests with the same key which are queued or
+    running at the same time are made once, their result being shared, and the queued request takes on the highest
+    priority it was made with. Any function can be scheduled, so that a stub reddit or none at all can stand in for
+    network access.
+    """
+
+    def __init__(self, rate=RATE, burst=BURST, concurrency=CONCURRENCY):
+        self.rate = rate                   # Tokens added per second, or None for no rate limit
+        self.burst = burst
+        self.concurrency = concurrency
+
+        self._condition = threading.Condition()
+        self._queue = []                   # Heap of (priority, order, request). Entries left by raised priority are skipped
+        self._requests = {}                # Requests queued or running, by key
+        self._queued = 0                   # Number of requests waiting for their turn
+        self._running = 0                  # Number of requests running
+        self._tokens = burst
+        self._refilled = time.monotonic()  # Time tokens were last added
+        self._order = itertools.count()
+
+        self.requests = 0                  # Number of requests made, not counting ones sharing result of another
+        self.deduplicated = 0              # Number of requests sharing result of another
+        self.queue_depth_max = 0           # Largest number of requests waiting at once
+
+    def call(self, key, function, priority=USER):
+        """Return result of function() once it is run in its turn, raising exception it raised if any.
+
+        Requests with the same key, unless it is None, share a single call of function while one is queued or running.
+        """
+
+        with self._condition:
+            request = self._requests.get(key) if key is not None else None
+            if request is not None:
+                self.deduplicated += 1
+                if priority < request.priority and not request.started:
+                    request.priority = priority
+                    heapq.heappush(self._queue, (priority, request.order, request))
+                    self._condition.notify_all()
+                while not request.done:
+                    self._condition.wait()
+                return request.outcome()
+
+            request = Request(key, priority, next(self._order))
+            heapq.heappush(self._queue, (priority, request.order, request))
+            if key is not None:
+                self._requests[key] = request
+            self.requests += 1
+            self._queued += 1
+            self.queue_depth_max = max(self.queue_depth_max, self._queued)
+
+            time_queued = time.perf_counter()
+            self._wait_turn(request)
+            redterm.profiler.profiler.record('scheduler', 'wait ' + PRIORITY_NAMES[request.priority],
+                                             time.perf_counter() - time_queued)
+
+        try:
+            request.result = function()
+        except Exception as error:
+            request.error = error
+        finally:
+            with self._condition:
+                request.done = True
+                self._running -= 1
+                if key is not None:
+                    del self._requests[key]
+                self._condition.notify_all()
+
+        return request.outcome()
+
+    def _wait_turn(self, request):
+        """Wait until request is first in queue, fewer than concurrency requests run and a token is free, then take
+        request off queue. Called with self._condition held.
+        """
+
+        while True:
+            # Drop entries of requests whose priority was raised since
+            while self._queue[0][0] != self._queue[0][2].priority:
+                heapq.heappop(self._queue)
+
+            timeout = None
+            if self._queue[0][2] is request and self._running < self.concurrency:
+                timeout = self._take_token()
+                if timeout is None:
+                    break
+            self._condition.wait(timeout)
+
+        heapq.heappop(self._queue)
+        request.started = True
+        self._queued -= 1
+        self._running += 1
+        self._condition.notify_all()  # Next request in queue may be able to go as well
+
+    def _take_token(self):
+        """Take a token from bucket and return None, or return seconds until there is one if bucket is empty."""
+
+        if self.rate is None:
+            return None
+
+        now = time.monotonic()
+        self._tokens = min(self._tokens + (now - self._refilled) * self.rate, self.burst)
+        self._refilled = now
+
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        self._tokens -= 1
+        return None
+
+    def summary(self):
+        """Return one line summary of requests made."""
+
+        return 'scheduler: {} requests, {} deduplicated, queue depth max {}'.format(
+            self.requests, self.deduplicated, self.queue_depth_max)
@@ -1,10 +1,19 @@
 import contextlib
+import itertools
 import logging
+import os
+import select
+import shutil
 import signal
 import sys
+import tempfile
+import time
 
 import blessed
 
+import redterm.profiler
+import redterm.text
+
 terminal = blessed.Terminal()
 
 # Key codes used in application.
@@ -12,22 +21,99 @@ KEY_DOWN = 258
 KEY_UP = 259
 KEY_LEFT = 260
 KEY_RIGHT = 261
+KEY_HOME = 262
+KEY_ERASE = 263  # Backspace key as sent by most terminals, used for deleting typed text
 KEY_BACKSPACE = 330
 KEY_PGDN = 338
 KEY_PGUP = 339
 KEY_ENTER = 343
+KEY_END = 360
 KEY_ESCAPE = 361
 
+RENDER_RETAIN_LINES = 20000  # Default number of render buffer lines to retain for pages not currently displayed.
+PAGE_BUDGET = 8              # Default number of pages held in memory, beyond which pages are spilled to disk.
+ITEM_BUDGET = 20000          # Default number of items held in memory by all pages, beyond which pages are spilled to disk.
+RESIZE_QUIET = 0.1           # Seconds terminal size must stay the same before page is reflowed to it.
+VIRTUAL_MARGIN = 20          # Number of items above screen to lay out for pages in virtual mode.
+
+
+class Screen:
+    """Keeps the last frame drawn to terminal, and writes only rows which have changed since."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.rows = []               # Rows of last frame drawn, including any overlays such as the cursor.
+
+        self.frames = 0              # Number of frames drawn.
+        self.bytes_written = 0       # Bytes actually written to terminal.
+        self.bytes_full = 0          # Bytes which would have been written if every row were redrawn each frame.
+        self.frame_time = 0.0        # Total time spent composing and writing frames.
+
+    def invalidate(self):
+        """Forget last frame so that the next frame is drawn in full."""
+
+        self.rows = []
+
+    def draw(self, rows):
+        """Draw frame to terminal with a single write."""
+
+        time_start = time.perf_counter()
+
+        previous = self.rows if len(self.rows) == len(rows) else [None] * len(rows)
+        output = []
+
+        # Redraw rows which have changed.
+        for row_no, row in enumerate(rows):
+            if row != previous[row_no]:
+                output.append(terminal.move(row_no, 0) + row)
+
+        if output:
+            output = ''.join(output)
+            self.stream.write(output)
+            self.stream.flush()
+            self.bytes_written += len(output.encode())
+
+        self.rows = list(rows)
+        self.frames += 1
+        self.bytes_full += sum(len((terminal.move(row_no, 0) + row).encode()) for row_no, row in enumerate(rows))
+        self.frame_time += time.perf_counter() - time_start
+
+    def stats(self):
+        """Return counters for frames drawn so far."""
+
+        return {'frames': self.frames,
+                'bytes_written': self.bytes_written,
+                'bytes_full': self.bytes_full,
+                'frame_time': self.frame_time}
+
+
+class RenderState:
+    """Render buffer and viewport of a page which is not currently displayed."""
+
+    def __init__(self, width, buffer, offset, offset_item):
+        self.width = width           # Terminal width buffer was built at.
+        self.buffer = buffer         # Render buffer, or None if it was dropped to save memory.
+        self.offset = offset
+        self.offset_item = offset_item
+
 
 class IO:
     """Handles rendering of Page objects."""
 
-    def __init__(self):
+    def __init__(self, render_retain_lines=RENDER_RETAIN_LINES, page_budget=PAGE_BUDGET, item_budget=ITEM_BUDGET):
         self.pages = []              # List of all Page-related objects generated for session.
         self.page_current = 0        # Keep track of current(last) page.
+        self.render_states = {}      # Render state retained for each page in self.pages other than current page.
+        self.render_retain_lines = render_retain_lines  # Max number of buffer lines held by self.render_states.
+
+        self.page_budget = page_budget  # Max number of pages holding their items in memory.
+        self.item_budget = item_budget  # Max number of items held in memory by all pages.
+        self.page_views = {}         # Order in which pages were last displayed, as a count by page.
+        self._view_count = itertools.count()
+        self._spill_dir = None       # Directory pages are spilled to, created when first needed.
 
         self.render_buffer = []      # Render buffer. Holds entire page to display.
-        self.render_offset = 0       # Offset to keep track of where in render buffer to render from.
+        self.render_offset = None    # Offset to keep track of where in render buffer to render from. None for new layout.
         self.render_offset_item = 0  # Extra offset to put in account of items which do not fit terminal size.
 
         self.terminal_width = 0      # Remember terminal width.
@@ -35,6 +121,16 @@ class IO:
 
         self.status_text = ''
 
+        self.screen = Screen()       # Last frame drawn to terminal.
+        self._paddings = {}          # Blank space padding lines, by number of cells.
+
+        self._resize_time = None     # When terminal was last resized, while page is waiting to be reflowed.
+
+        # Pipe written to by signal handler, so that get_key() stops waiting
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        os.set_blocking(self._wake_write, False)
+
         # Initialize terminal
         print(terminal.enter_fullscreen)
         print(terminal.clear)
@@ -45,74 +141,269 @@ class IO:
     def render(self):
         """Render last page while keeping in account of key press updates and resizing."""
 
-        self.page_current = self.pages[-1]
+        # Lines are laid out at the old width until page is reflowed, so keep old frame on screen until then
+        if self._resize_time is not None:
+            return
+
+        self._update_viewport()
+
+        # Only show status if no items exist in page yet.
+        if not self.page_current.items:
+            self.screen.draw([terminal.on_black(' ' * self.terminal_width)] * self.terminal_height + [self._status_row()])
+            return
+
+        with redterm.profiler.profiler.timer('phase', 'render'):
+            # Compose frame from buffer content, or from lines laid out just for screen in virtual mode
+            line_start = self.render_offset + self.render_offset_item
+            if self.page_current.virtual:
+                rows = [self._pad_line(line) for line in self.page_current.lines(line_start, self.terminal_height)]
+            else:
+                rows = [self._pad_line(line) for line in self.render_buffer[line_start:line_start + self.terminal_height]]
+
+            # Print blank lines in case buffer is empty
+            rows += [terminal.on_black(' ' * self.terminal_width)] * (self.terminal_height - len(rows))
+
+            # Render status
+            rows.append(self._status_row())
+
+            # Render cursor over the row of the selected item, if it is on screen.
+            cursor_row = self.page_current.item_onscreenlocs[self.page_current.item_selected] - self.render_offset
+            if self.render_offset_item == 0 and 0 <= cursor_row < self.terminal_height:
+                cursor = terminal.white_on_black('>')
+                try:
+                    cursor += terminal.white_on_black('-' * (self.page_current.item_indentations[self.page_current.item_selected] * 2))
+                except IndexError:
+                    pass
+                rows[cursor_row] += terminal.move(cursor_row, 0) + cursor
+
+            self.screen.draw(rows)
+
+    def _update_viewport(self):
+        """Lay out last page around screen, and move render offset so that selected item is on screen."""
+
+        if self.pages[-1] is not self.page_current:
+            self._switch_page()
 
         # Remember terminal size.
         self.terminal_width = terminal.width
         self.terminal_height = terminal.height - 1
 
-        # Do not render if no items exist in page yet.
         if not self.page_current.items:
             return
 
-        # Fill buffer with content if empty.
-        if not self.render_buffer:
-            for line in self.page_current.item_strings_formatted:
-                line += terminal.on_black(' ' * (self.terminal_width - terminal.length(line)))
-                self.render_buffer.append(line)
+        with redterm.profiler.profiler.timer('phase', 'layout'):
+            if self.page_current.virtual:
+                self._layout_viewport()
+            else:
+                self._fill_buffer()
+
+        # Start from selected item if page layout is new.
+        if self.render_offset is None:
             self.render_offset = self.page_current.item_onscreenlocs[self.page_current.item_selected]
 
         # Adjust the rendering offset if selected menu item is out of bounds of current terminal.
-        if self.page_current.item_onscreenlocs[self.page_current.item_selected] >= self.render_offset + self.terminal_height:
+        loc_selected = self.page_current.item_onscreenlocs[self.page_current.item_selected]
+        if loc_selected >= self.render_offset + self.terminal_height:
             self.render_offset += self.terminal_height
-        elif self.page_current.item_onscreenlocs[self.page_current.item_selected] < self.render_offset:
+        elif loc_selected < self.render_offset:
             self.render_offset -= self.terminal_height
             if self.render_offset < 0:
                 self.render_offset = 0
 
-        # Render buffer content to terminal
-        for buffer_line_no in range(self.terminal_height):
-            try:
-                buffer_line = self.render_buffer[self.render_offset + self.render_offset_item + buffer_line_no]
-                print(terminal.move(buffer_line_no, 0) + buffer_line, end='')
-            except IndexError:
-                # Print blank line in case buffer is empty
-                print(terminal.move(buffer_line_no, 0) + (terminal.on_black(' ' * self.terminal_width)), end='')
-
-        # Render status
-        print(terminal.move(self.terminal_height, 0) + (terminal.black_on_cyan(self.status_text + ' ' * (self.terminal_width - terminal.length(self.status_text)))), end='')
-
-        # Render cursor.
-        # TODO Need to fix bug where the cursor occasionally gets drawn outside the screen and disrupting the rendering process
-        if self.render_offset_item == 0:
-            cursor = terminal.white_on_black('>')
-            try:
-                cursor += terminal.white_on_black('-' * (self.page_current.item_indentations[self.page_current.item_selected] * 2))
-            except IndexError:
-                pass
-            print(terminal.move(self.page_current.item_onscreenlocs[self.page_current.item_selected] - self.render_offset, 0) + cursor)
+    def _fill_buffer(self):
+        """Bring render buffer up to date with formatted lines of current page."""
+
+        # Apply changes made in place to lines already in buffer, unless buffer is to be filled from scratch.
+        if self.render_buffer:
+            for line_start, line_count, lines in self.page_current.layout_patches:
+                self.render_buffer[line_start:line_start + line_count] = lines
+        del self.page_current.layout_patches[:]
+
+        # Fill buffer with content not yet in it.
+        if not self.render_buffer or len(self.page_current.item_onscreenlocs) < len(self.page_current.item_strings):
+            self.render_buffer.extend(self.page_current.item_strings_formatted[len(self.render_buffer):])
+
+    def _layout_viewport(self):
+        """Lay out items around screen for page in virtual mode.
+
+        Item at top of screen is kept in place while estimated heights of items above it get corrected.
+        """
+
+        page = self.page_current
+        page.sync_layout()
+        del page.layout_patches[:]
+
+        if self.render_offset is None:
+            self.render_offset = page.item_onscreenlocs[page.item_selected]
+
+        top_item = page.item_onscreenlocs.find(self.render_offset)
+        top_item_line = self.render_offset - page.item_onscreenlocs[top_item]
+
+        page.layout_items(top_item - VIRTUAL_MARGIN, top_item + 1)
+        page.layout_items(page.item_selected - 1, page.item_selected + 2)
+
+        self.render_offset = page.item_onscreenlocs[top_item] + top_item_line
+
+    def _status_row(self):
+        """Return status line padded to terminal width."""
+
+        return terminal.black_on_cyan(self.status_text + ' ' * (self.terminal_width - redterm.text.text_width(self.status_text)))
+
+    def _pad_line(self, line):
+        """Return laid out line with escape sequences of its styles, padded to terminal width."""
+
+        padding_width = self.terminal_width - line.width
+        try:
+            padding = self._paddings[padding_width]
+        except KeyError:
+            padding = self._paddings[padding_width] = terminal.on_black(' ' * padding_width)
+        return line.render(terminal, padding)
 
     def on_resize(self, *args):
-        """Re-perform wrapping of text to accommodate new terminal size."""
+        """Note that terminal was resized. Page is reflowed by reflow_if_resized() once resizing stops."""
+
+        self._resize_time = time.monotonic()
+        self.wake()
+
+    def wake(self):
+        """Make get_key() return without waiting for a key. Safe to call from signal handlers and other threads."""
+
+        wake_write = self._wake_write
+        if wake_write is None:                                         # Closed, so there is nothing to wake
+            return
+
+        try:
+            os.write(wake_write, b'\0')
+        except BlockingIOError:                                        # Pipe is full, so get_key() will wake anyway
+            pass
+
+    def close(self):
+        """Close pipe get_key() is woken up through. Background threads may still call wake(), which then does nothing."""
+
+        if self._wake_write is None:
+            return
+
+        wake_read, wake_write = self._wake_read, self._wake_write
+        self._wake_read = self._wake_write = None
+        os.close(wake_read)
+        os.close(wake_write)
+
+    def reflow_if_resized(self):
+        """Reflow page if terminal was resized and has kept its size for RESIZE_QUIET. Return True if page was reflowed."""
+
+        if self._resize_time is None or time.monotonic() - self._resize_time < RESIZE_QUIET:
+            return False
+
+        self._resize_time = None
+        self.reflow()
+        return True
+
+    def reflow(self):
+        """Re-perform wrapping of text to accommodate new terminal size.
+
+        Previous frame stays on screen until the new one is drawn. Items are laid out again from the page's layout cache
+        if the page was laid out at this width before.
+        """
 
         self.page_current.width = terminal.width                       # Give page new terminal width
+        del self.page_current.layout_patches[:]                        # Patches were made at previous width
         self.render_buffer = []
+        self.render_offset = None
+        self.screen.invalidate()                                       # Terminal may have moved content around
 
         self.render()                                                  # Re-render buffer
 
     def reset(self):
-        """Empty render buffer and repopulate it with current page."""
+        """Render last page, reusing its render buffer if it is still valid for current terminal size."""
 
-        # TODO Need to redo this so that it doesn't scrap cached page data each time this is run.
+        if self.pages[-1] is not self.page_current:
+            self._switch_page()
 
-        self.page_current = self.pages[-1]
-        self.page_current.width = terminal.width                       # Give page new terminal width
+        if self.page_current.width != terminal.width:
+            self.page_current.width = terminal.width                   # Give page new terminal width
+            self.render_buffer = []
+            self.render_offset = None
+
+        self.render()
+
+    def reload(self):
+        """Lay out current page from scratch and show it from selected item, such as after all its items were replaced."""
 
         self.render_buffer = []
-        #self.render_offset = 0
-        #self.render_offset_item = 0
+        self.render_offset = None
+        self.render_offset_item = 0
 
-        self.render()
+    def _switch_page(self):
+        """Retain render state of page being left, and restore render state of last page if there is one."""
+
+        if self.page_current in self.pages:
+            self.render_states[self.page_current] = RenderState(self.terminal_width, self.render_buffer,
+                                                                self.render_offset, self.render_offset_item)
+
+        self.page_current = self.pages[-1]
+        self.page_views[self.page_current] = next(self._view_count)
+        if self.page_current.spilled:
+            self.page_current.rehydrate()
+        state = self.render_states.pop(self.page_current, None)
+
+        if state and state.width == terminal.width:
+            self.render_buffer = state.buffer or []
+            self.render_offset = state.offset
+            self.render_offset_item = state.offset_item
+        else:
+            self.render_buffer = []
+            self.render_offset = None
+            self.render_offset_item = 0
+
+        self.page_current.width = terminal.width                       # Give page new terminal width
+
+        self._trim_render_states()
+        self._spill_pages()
+
+    def _spill_pages(self):
+        """Spill least recently displayed pages other than current page to disk while over page or item budget.
+
+        Pages which are loading in background stay in memory. Render state of a spilled page keeps its viewport, so
+        that it is shown as it was left once rehydrated, while its buffer is dropped as it is rebuilt from the page.
+        """
+
+        pages_held = [page for page in self.pages if not page.spilled]
+        items_held = sum(len(page.items) for page in pages_held)
+
+        for page in sorted(pages_held, key=lambda page: self.page_views.get(page, -1)):
+            if len(pages_held) <= self.page_budget and items_held <= self.item_budget:
+                break
+            if page is self.page_current or page.loading:
+                continue
+
+            if self._spill_dir is None:
+                self._spill_dir = tempfile.mkdtemp(prefix='redterm-')
+            items_held -= len(page.items)
+            pages_held.remove(page)
+            page.spill(os.path.join(self._spill_dir, '{}.page'.format(id(page))))
+
+            state = self.render_states.get(page)
+            if state is not None:
+                state.buffer = None
+
+    def _trim_render_states(self):
+        """Forget render states and views of closed pages, and drop buffers of the oldest pages if over the retain limit."""
+
+        retained_lines = 0
+        for page in reversed(self.pages):
+            state = self.render_states.get(page)
+            if state is None or state.buffer is None:
+                continue
+            retained_lines += len(state.buffer)
+            if retained_lines > self.render_retain_lines:
+                state.buffer = None
+
+        for page in list(self.render_states):
+            if page not in self.pages:
+                del self.render_states[page]
+        for page in list(self.page_views):
+            if page not in self.pages:
+                del self.page_views[page]
 
     def _get_distance_betweenitems(self, item_no1, item_no2):
         """Determine distance between 2 items does not fit terminal height"""
@@ -135,58 +426,97 @@ class IO:
 
         # If current item fits terminal height choose next item,
         # if not, adjust render_offset_item without selecting new item(Edge case)
-        loc_diff = self._get_distance_betweenitems(self.page_current.item_selected, self.page_current.item_selected + 1)
+        item_next = self.page_current.item_next(self.page_current.item_selected)
+        loc_diff = self._get_distance_betweenitems(self.page_current.item_selected, item_next)
         if loc_diff - self.render_offset_item < self.terminal_height:
-            self.page_current.item_selected += 1
+            self.page_current.item_selected = item_next
             self.render_offset_item = 0
         else:
             self.render_offset_item += self.terminal_height
 
-        self.render()  # TODO Why the render function needs to be called for instant update unknown. Need to look into.
+        self._update_viewport()  # Keep offsets following selection, so that several moves can be made before next render
 
     def select_item_prev(self):
         """Determine whether to render the previous item, or just adjust self.render_offset_item."""
 
-        loc_diff = self._get_distance_betweenitems(self.page_current.item_selected, self.page_current.item_selected - 1)
+        item_prev = self.page_current.item_prev(self.page_current.item_selected)
+        loc_diff = self._get_distance_betweenitems(self.page_current.item_selected, item_prev)
         if loc_diff + self.render_offset_item < self.terminal_height:
-            self.page_current.item_selected -= 1
+            self.page_current.item_selected = item_prev
             self.render_offset_item = 0
         else:
             self.render_offset_item -= self.terminal_height
 
-        self.render()  # TODO Why the render function needs to be called for instant update unknown. Need to look into.
+        self._update_viewport()  # Keep offsets following selection, so that several moves can be made before next render
+
+    def select_item(self, item_no):
+        """Select item, moving rendering offset to it if it is not on screen."""
+
+        if item_no is None:
+            return
+
+        self._update_viewport()  # Lay out items merged since last render, which item may be one of
+
+        self.page_current.item_selected = item_no
+        self.render_offset_item = 0
+
+        loc = self.page_current.item_onscreenlocs[self.page_current.item_selected]
+        if not self.render_offset <= loc < self.render_offset + self.terminal_height:
+            self.render_offset = loc
+
+    def select_item_first(self):
+        """Select first item of page."""
+
+        self.select_item(0)
+
+    def select_item_last(self):
+        """Select last item of page."""
+
+        self.select_item(self.page_current.item_visible(len(self.page_current.items) - 1))
+
+    def select_item_number(self, item_number):
+        """Select item by its number, counting from 1."""
+
+        item_no = min(max(item_number - 1, 0), len(self.page_current.items) - 1)
+        self.select_item(self.page_current.item_visible(item_no))
+
+    def select_item_percent(self, percent):
+        """Select item found at given percentage of page."""
+
+        self._update_viewport()  # Count lines of items merged since last render as well
+
+        line = self.page_current.line_count * min(max(percent, 0), 100) // 100
+        self.select_item(self.page_current.item_visible(self.page_current.item_at_line(line)))
 
     def select_item_nextscreen(self):
         """pass"""
 
+        self._update_viewport()  # Lay out items merged since last render, so that selected item has a location
+
         self.page_current.item_selected = self._get_out_of_screen_item_loc_next()
 
     def select_item_prevscreen(self):
         """pass"""
 
+        self._update_viewport()  # Lay out items merged since last render, so that selected item has a location
+
         self.page_current.item_selected = self._get_out_of_screen_item_loc_prev()
 
     def _get_out_of_screen_item_loc_next(self):
         """Returns closest item index on next page."""
 
         new_loc = self.page_current.item_onscreenlocs[self.page_current.item_selected] + self.terminal_height + 1
-        closest_item_index = self._get_index_closest_val(self.page_current.item_onscreenlocs, new_loc)
+        closest_item_index = self.page_current.item_at_line(new_loc)
 
-        return closest_item_index
+        return self.page_current.item_visible(closest_item_index)
 
     def _get_out_of_screen_item_loc_prev(self):
         """Returns closest item index on previous page."""
 
         new_loc = self.page_current.item_onscreenlocs[self.page_current.item_selected] - self.terminal_height
-        closest_item_index = self._get_index_closest_val(self.page_current.item_onscreenlocs, new_loc)
-
-        return closest_item_index
-
-    @staticmethod
-    def _get_index_closest_val(list, val):
-        """Return index of closest value within list."""
+        closest_item_index = self.page_current.item_at_line(new_loc)
 
-        return min(range(len(list)), key=lambda i: abs(list[i]-val))
+        return self.page_current.item_visible(closest_item_index)
 
     @contextlib.contextmanager
     def setup(self):
@@ -196,11 +526,45 @@ class IO:
             with terminal.cbreak(), terminal.hidden_cursor():
                 yield
         finally:
+            for page in self.pages:                                    # Stop background work, which Python would wait for
+                page.close()
+            logging.debug('Screen: %s', self.screen.stats())
+            if self._spill_dir is not None:
+                shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self.close()
             print(terminal.clear)
             print(terminal.exit_fullscreen)
 
-    @staticmethod
-    def get_key(timeout=0):
-        """Returns input object."""
+    def get_key(self, timeout=0):
+        """Returns input object, which is empty if no key was pressed before timeout or wake() was called.
+
+        Waits for either of these if timeout is None, but no longer than until a pending reflow is due.
+        """
+
+        if self._resize_time is not None:
+            resize_due = max(self._resize_time + RESIZE_QUIET - time.monotonic(), 0)
+            timeout = resize_due if timeout is None else min(timeout, resize_due)
+
+        # Wait for either keyboard or wake pipe, unless blessed already has keys buffered or keyboard is not a terminal
+        if terminal._keyboard_fd is not None and not terminal._keyboard_buf:
+            readable, _, _ = select.select([terminal._keyboard_fd, self._wake_read], [], [], timeout)
+            if self._wake_read in readable:
+                with contextlib.suppress(BlockingIOError):
+                    while os.read(self._wake_read, 512):
+                        pass
+            if terminal._keyboard_fd not in readable:
+                return terminal.inkey(timeout=0)
 
         return terminal.inkey(timeout=timeout)
+
+    @staticmethod
+    def key_pending():
+        """Return whether keys were pressed which have not been read yet."""
+
+        return bool(terminal._keyboard_buf) or terminal.kbhit(timeout=0)
+
+    @staticmethod
+    def unget_key(key_pressed):
+        """Put key back, to be returned by next get_key()."""
+
+        terminal.ungetch(str(key_pressed))
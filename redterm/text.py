@@ -0,0 +1,262 @@
+import itertools
+import textwrap
+import unicodedata
+
+import wcwidth
+
+
+TAB_SIZE = 8  # Tabs are expanded to this many columns when wrapping, as blessed's Terminal.wrap() does
+
+_widths = {chr(code): 1 for code in range(32, 127)}  # Display width of each character met so far
+_sequences = {}                                       # Escape sequences of styles, by (terminal, style name)
+
+
+def char_width(char):
+    """Return number of terminal cells character takes up."""
+
+    try:
+        return _widths[char]
+    except KeyError:
+        width = _widths[char] = max(wcwidth.wcwidth(char), 0)  # Control characters take up no cells
+        return width
+
+
+def text_width(text):
+    """Return number of terminal cells plain text takes up."""
+
+    if text.isascii() and text.isprintable():
+        return len(text)
+    return sum(map(char_width, text))
+
+
+def sequence(terminal, style):
+    """Return escape sequence which turns on style, such as 'bold' or 'cyan_on_black', on terminal."""
+
+    try:
+        return _sequences[(terminal, style)]
+    except KeyError:
+        escape = _sequences[(terminal, style)] = str(getattr(terminal, style))
+        return escape
+
+
+class StyledText:
+    """Plain text with runs of styles, which are names of blessed formatting attributes such as 'bold' or 'cyan_on_black'.
+
+    Measuring and wrapping work on plain text. Escape sequences are only made by render(), once text is drawn. Adding
+    str or StyledText to StyledText makes new StyledText, keeping style of whole text of the left one.
+    """
+
+    __slots__ = ('text', 'runs', 'style', '_hash', '_width', '_rendered')
+
+    def __init__(self, text='', runs=(), style=None):
+        self.text = text
+        self.runs = runs       # Tuple of (start, end, style) of parts of text drawn in style, in order and not overlapping
+        self.style = style     # Style of whole text, which styles of runs are added to
+        self._hash = None
+        self._width = None
+        self._rendered = None  # (terminal, end, escaped text) of last render
+
+    def __add__(self, other):
+        if isinstance(other, str):
+            return StyledText(self.text + other, self.runs, self.style)
+        return StyledText(self.text + other.text, self.runs + other._shifted_runs(len(self.text)), self.style)
+
+    def __radd__(self, other):
+        return StyledText(other + self.text, self._shifted_runs(len(other)), self.style)
+
+    def __eq__(self, other):
+        return (isinstance(other, StyledText) and self.text == other.text and self.runs == other.runs and
+                self.style == other.style)
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((self.text, self.runs, self.style))
+        return self._hash
+
+    def __reduce__(self):
+        return StyledText, (self.text, self.runs, self.style)
+
+    def __repr__(self):
+        return '<StyledText {!r}>'.format(self.text)
+
+    @property
+    def width(self):
+        """Return number of terminal cells text takes up."""
+
+        if self._width is None:
+            self._width = text_width(self.text)
+        return self._width
+
+    def _shifted_runs(self, offset):
+        """Return runs moved along text by offset."""
+
+        return tuple((start + offset, end + offset, style) for start, end, style in self.runs)
+
+    def slice(self, start, end):
+        """Return part of text from start up to end, with its styles."""
+
+        runs = tuple((max(run_start, start) - start, min(run_end, end) - start, style)
+                     for run_start, run_end, style in self.runs if run_start < end and run_end > start)
+        return StyledText(self.text[start:end], runs, self.style)
+
+    def splitlines(self):
+        """Return lines of text, breaking where str.splitlines() does."""
+
+        lines = []
+        start = 0
+        for line, line_with_end in zip(self.text.splitlines(), self.text.splitlines(True)):
+            lines.append(self.slice(start, start + len(line)))
+            start += len(line_with_end)
+        return lines
+
+    def expandtabs(self):
+        """Return text with tabs expanded to TAB_SIZE columns, moving styles along."""
+
+        if '\t' not in self.text:
+            return self
+
+        # Position in expanded text of each character, and of end of text
+        positions = []
+        position = 0
+        column = 0
+        for char in self.text:
+            positions.append(position)
+            step = TAB_SIZE - column % TAB_SIZE if char == '\t' else 1
+            column = 0 if char in '\r\n' else column + step
+            position += step
+        positions.append(position)
+
+        runs = tuple((positions[start], positions[end], style) for start, end, style in self.runs)
+        return StyledText(self.text.expandtabs(TAB_SIZE), runs, self.style)
+
+    def wrap(self, width):
+        """Return single line of text broken into lines no wider than width cells, at the same places as blessed's
+        Terminal.wrap() breaks plain text.
+
+        Tabs are expanded and other whitespace shown as spaces. Whitespace at ends of lines is dropped, except at start of
+        text. Empty text has no lines, and line of only whitespace becomes a single empty line.
+        """
+
+        if not self.text:
+            return []
+
+        line = self.expandtabs()
+        text = line.text.translate(textwrap.TextWrapper.unicode_whitespace_trans)
+        line = StyledText(text, line.runs, line.style)
+        if not text.strip():
+            return [StyledText('', (), self.style)]
+
+        # Width of text between two positions, from running total of character widths unless all are one cell wide
+        if text.isascii() and text.isprintable():
+            def span_width(start, end):
+                return end - start
+        else:
+            widths = [0]
+            widths.extend(itertools.accumulate(map(char_width, text)))
+
+            def span_width(start, end):
+                return widths[end] - widths[start]
+
+        # Break text into words and whitespace as textwrap does, as (start, end) spans in reverse order
+        chunks = []
+        end = 0
+        for chunk in textwrap.TextWrapper.wordsep_re.split(text):
+            if chunk:
+                chunks.append((end, end + len(chunk)))
+                end += len(chunk)
+        chunks.reverse()
+
+        # Fill lines greedily, like textwrap.TextWrapper._wrap_chunks() with wcwidth's handling of long words
+        spans = []
+        while chunks:
+            line_chunks = []
+            line_width = 0
+
+            if spans and not text[chunks[-1][0]:chunks[-1][1]].strip():
+                del chunks[-1]
+
+            while chunks and line_width + span_width(*chunks[-1]) <= width:
+                line_chunks.append(chunks.pop())
+                line_width += span_width(*line_chunks[-1])
+
+            if chunks and span_width(*chunks[-1]) > width:
+                self._break_word(text, chunks, line_chunks, width - line_width if width >= 1 else 1, span_width)
+                while chunks and chunks[-1][0] == chunks[-1][1]:
+                    del chunks[-1]
+
+            if line_chunks and not text[line_chunks[-1][0]:line_chunks[-1][1]].strip():
+                del line_chunks[-1]
+
+            if line_chunks:
+                start = line_chunks[0][0]
+                end = start + len(text[start:line_chunks[-1][1]].rstrip())
+                if end > start:
+                    spans.append((start, end))
+
+        return [line.slice(start, end) for start, end in spans]
+
+    @staticmethod
+    def _break_word(text, chunks, line_chunks, space_left, span_width):
+        """Move as much of next chunk as fits space_left onto line, after its last hyphen if it has one."""
+
+        start, end = chunks[-1]
+
+        # Take characters while they fit, including characters which take up no cells such as combining marks
+        prefix_end = start
+        prefix_width = 0
+        while prefix_end < end and prefix_width + char_width(text[prefix_end]) <= space_left:
+            prefix_width += char_width(text[prefix_end])
+            prefix_end += 1
+
+        hyphen = text.rfind('-', start, prefix_end)
+        if hyphen > start and text[start:hyphen].strip('-'):
+            break_end = hyphen + 1
+        else:
+            break_end = prefix_end
+            if not line_chunks and (break_end == start or (break_end < end and span_width(start, break_end) == 0)):
+                break_end = start + 1  # Line always gets at least one character, with any combining marks after it
+                while break_end < end and unicodedata.combining(text[break_end]):
+                    break_end += 1
+
+        line_chunks.append((start, break_end))
+        chunks[-1] = (break_end, end)
+
+    def render(self, terminal, end=''):
+        """Return text with escape sequences of its styles for terminal, followed by end such as padding."""
+
+        if self._rendered is not None and self._rendered[0] is terminal and self._rendered[1] == end:
+            return self._rendered[2]
+
+        base = sequence(terminal, self.style) if self.style else ''
+        normal = sequence(terminal, 'normal') if self.style or self.runs else ''
+
+        parts = [base]
+        position = 0
+        for run_start, run_end, style in self.runs:
+            parts += (self.text[position:run_start], sequence(terminal, style), self.text[run_start:run_end], normal, base)
+            position = run_end
+        parts.append(self.text[position:])
+        if self.style:
+            parts.append(normal)
+        parts.append(end)
+
+        rendered = ''.join(parts)
+        self._rendered = (terminal, end, rendered)
+        return rendered
+
+
+class Styles:
+    """Makes StyledText in style named by attribute, as blessed's formatting attributes make escaped strings.
+
+    styles.bold('text') is text drawn in bold.
+    """
+
+    def __getattr__(self, style):
+        def make(text):
+            return StyledText(text, ((0, len(text), style),) if text else ())
+
+        setattr(self, style, make)
+        return make
+
+
+styles = Styles()  # Shared by all modules
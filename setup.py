@@ -47,16 +47,22 @@ setup(
         'Topic :: Internet :: WWW/HTTP :: Dynamic Content :: News/Diary',
         'Topic :: Terminals',
         'License :: OSI Approved :: MIT License',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
     ],
 
     keywords='reddit terminal praw curses',
 
-    packages=find_packages(exclude=['contrib', 'docs', 'tests*']),
+    packages=find_packages(exclude=['contrib', 'docs', 'tests*', 'benchmarks*']),
 
-    install_requires=['blessed>=1.12.0', 'uniseg>=0.7.1', 'praw>=3.3.0', 'pyyaml>=3.11'],
+    # concurrent.futures.Executor.shutdown(cancel_futures=True) is new in Python 3.9
+    python_requires='>=3.9',
+
+    install_requires=['blessed>=1.12.0', 'uniseg>=0.7.1', 'wcwidth', 'praw>=3.3.0', 'pyyaml>=3.11'],
 
     # To provide executable scripts, use entry points in preference to the
     # "scripts" keyword. Entry points provide cross-platform support and allow
@@ -0,0 +1,57 @@
+"""Fixtures pointing redterm at the synthetic reddit and headless terminal benchmarks use, so that no tty or network is needed."""
+
+import contextlib
+import io
+
+import pytest
+
+import redterm.api
+import redterm.pages
+import redterm.scheduler
+import redterm.terminal
+
+from benchmarks import fixtures
+
+
+WIDTH = 80
+HEIGHT = 24
+
+
+@pytest.fixture
+def terminal(monkeypatch):
+    """Headless terminal standing in for the real one."""
+
+    terminal = fixtures.HeadlessTerminal(WIDTH, HEIGHT)
+    monkeypatch.setattr(redterm.terminal, 'terminal', terminal)
+    return terminal
+
+
+@pytest.fixture
+def reddit(monkeypatch):
+    """Synthetic reddit which pages fetch from, with no rate limit for requests to it."""
+
+    reddit = fixtures.Reddit(submission_count=300, comment_count=3000)
+    monkeypatch.setattr(redterm.pages, 'api', redterm.api.API(reddit, scheduler=redterm.scheduler.Scheduler(rate=None)))
+    return reddit
+
+
+@pytest.fixture
+def make_io(terminal):
+    """Return function making IO which shows page on headless terminal. IOs made are closed after test."""
+
+    terminal_ios = []
+
+    def make_io(page):
+        with contextlib.redirect_stdout(io.StringIO()):
+            terminal_io = redterm.terminal.IO()
+        terminal_io.screen.stream = terminal.stream
+        terminal_io.pages.append(page)
+        terminal_ios.append(terminal_io)
+        return terminal_io
+
+    yield make_io
+
+    for terminal_io in terminal_ios:
+        terminal_io.close()
+        for page in terminal_io.pages:
+            page.close()
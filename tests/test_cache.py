@@ -0,0 +1,62 @@
+"""Listings extended a page at a time must still expire when the first part of them was cached."""
+
+import itertools
+
+import redterm.api
+import redterm.cache
+import redterm.scheduler
+
+
+class Submission:
+    def __init__(self, number):
+        self.id = str(number)
+        self.name = 't3_' + self.id
+
+
+class Subreddit:
+    def get_hot(self, limit, params):
+        start = int(params['after'][3:]) + 1 if params else 0
+        return (Submission(number) for number in range(start, start + limit))
+
+
+class Reddit:
+    def get_subreddit(self, subreddit_title):
+        return Subreddit()
+
+
+def created(cache, kind, key):
+    return cache._connection.execute('SELECT created FROM cache WHERE kind = ? AND key = ?', (kind, key)).fetchone()[0]
+
+
+def test_put_keeps_created_only_if_asked(tmp_path, monkeypatch):
+    cache = redterm.cache.Cache(str(tmp_path / 'cache.sqlite'))
+    clock = itertools.count(1000)
+    monkeypatch.setattr(redterm.cache.time, 'time', lambda: next(clock))
+
+    cache.put('listing', 'python', [1])
+    first = created(cache, 'listing', 'python')
+    cache.put('listing', 'python', [1, 2], keep_created=True)
+    assert created(cache, 'listing', 'python') == first
+    assert cache.get('listing', 'python') == [1, 2]
+
+    cache.put('listing', 'python', [3])
+    assert created(cache, 'listing', 'python') > first
+    cache.put('listing', 'other', [4], keep_created=True)
+    assert cache.get('listing', 'other') == [4]
+
+
+def test_extending_listing_keeps_its_expiry(tmp_path):
+    cache = redterm.cache.Cache(str(tmp_path / 'cache.sqlite'))
+    api = redterm.api.API(reddit=Reddit(), cache=cache, scheduler=redterm.scheduler.Scheduler(rate=None))
+
+    assert len(list(api.get_hot('python', limit=30))) == 30
+    first = created(cache, 'listing', 'python')
+
+    assert len(list(api.get_hot('python', limit=80))) == 80
+    assert len(cache.get('listing', 'python')) == 80
+    assert created(cache, 'listing', 'python') == first
+
+    # Once expired, listing is fetched anew and cached as fresh
+    cache._connection.execute('UPDATE cache SET created = created - 3600')
+    assert [submission.id for submission in api.get_hot('python', limit=30)][:2] == ['0', '1']
+    assert created(cache, 'listing', 'python') >= first
@@ -0,0 +1,181 @@
+"""Comment pages of threads with "More comments" placeholders, fetched through a stub instead of reddit."""
+
+import concurrent.futures
+import copy
+import random
+import threading
+
+import pytest
+
+import redterm.pages
+
+from benchmarks import fixtures
+
+
+def test_close_drops_more_comments_fetches_not_started(reddit, monkeypatch):
+    release = threading.Event()
+    fetched = []
+
+    def get_more_comments(more_comments):
+        fetched.append(more_comments)
+        release.wait(5)
+        return []
+
+    monkeypatch.setattr(redterm.pages.api, 'get_more_comments', get_more_comments)
+    page = redterm.pages.PageSubmission(fixtures.make_submission(600, more_every=10), 80, stream=False)
+    page.expand_all_more_comments()
+    futures = list(page._more_comments.values())
+    assert len(futures) == 60
+
+    page.close()
+    release.set()
+    page._more_comments_executor.shutdown(wait=True)
+
+    assert len(fetched) <= redterm.pages.MORE_COMMENTS_WORKERS
+    assert sum(future.cancelled() for future in futures) == len(futures) - len(fetched)
+
+
+def comment(comment_id, parent_id, replies=()):
+    reply = fixtures.Comment(comment_id, parent_id, 'body of ' + comment_id, 'author', 1)
+    reply.replies = list(replies)
+    return reply
+
+
+def more_comments(comment_id, parent_id):
+    return fixtures.MoreComments(comment_id, parent_id, 3)
+
+
+def submission(comments):
+    return fixtures.Submission(0, random.Random(0), comments)
+
+
+def children(more):
+    """Return comments stub reddit has for "More comments" placeholder, as a flat list in display order."""
+
+    return [comment(more.id + 'a', more.parent_id), comment(more.id + 'b', 't1_' + more.id + 'a'),
+            comment(more.id + 'c', more.parent_id)]
+
+
+def children_nested(more):
+    """Return comments of children(), with replies nested below the comments they reply to."""
+
+    return [comment(more.id + 'a', more.parent_id, [comment(more.id + 'b', 't1_' + more.id + 'a')]),
+            comment(more.id + 'c', more.parent_id)]
+
+
+def expanded(comments):
+    """Return comment tree with "More comments" placeholders replaced by comments stub reddit has for them."""
+
+    tree = []
+    for reply in comments:
+        if hasattr(reply, 'body'):
+            tree.append(copy.copy(reply))
+            tree[-1].replies = expanded(reply.replies)
+        else:
+            tree.extend(children_nested(reply))
+    return tree
+
+
+@pytest.fixture
+def stub_more_comments(reddit, monkeypatch):
+    """Make "More comments" fetches return children() of placeholder."""
+
+    monkeypatch.setattr(redterm.pages.api, 'get_more_comments', children)
+
+
+def expand(page, item_numbers):
+    """Fetch comments of "More comments" items and merge them into page."""
+
+    for item_no in item_numbers:
+        page.expand_more_comments(item_no)
+    concurrent.futures.wait(list(page._more_comments.values()))
+    assert page.poll()
+
+
+def check_tree(comment_tree):
+    """Check that nodes agree with each other on indexes, depths, subtree ranges and reply counts."""
+
+    for index, node in enumerate(comment_tree.nodes):
+        assert node.index == index
+        assert node.depth == (0 if node.parent is None else node.parent.depth + 1)
+        assert node.parent is None or node.parent.index < index < node.parent.end
+
+        end = index + 1
+        while end < len(comment_tree) and comment_tree.nodes[end].depth > node.depth:
+            end += 1
+        assert node.end == end
+        assert node.reply_count == sum(reply.parent is node for reply in comment_tree.nodes)
+        assert comment_tree.nodes_by_id[node.comment.id] is node
+
+
+def check_like_fresh_page(page, comments, collapsed_ids=()):
+    """Check that page shows and lays out the same as a page made from comments with placeholders already expanded."""
+
+    fresh_submission = submission(expanded(comments))
+    fresh_submission.num_comments = page.submission.num_comments
+    fresh = redterm.pages.PageSubmission(fresh_submission, page.width, stream=False)
+    for item_no in range(len(fresh.items)):
+        if fresh.items[item_no].id in collapsed_ids and item_no not in fresh.items_collapsed:
+            fresh.toggle_collapse(item_no)
+
+    check_tree(page.comment_tree)
+    assert [item.id for item in page.items] == [item.id for item in fresh.items]
+    assert page.item_indentations == fresh.item_indentations
+    assert page.items_hidden == fresh.items_hidden
+    assert page.items_collapsed == fresh.items_collapsed
+    assert page.item_strings_formatted == fresh.item_strings_formatted
+    assert list(page.item_onscreenlocs) == list(fresh.item_onscreenlocs)
+
+
+def test_splice_places_comments_below_their_parents(stub_more_comments):
+    comments = [comment('c0', 't3_s0', [comment('c1', 't1_c0', [more_comments('m1', 't1_c1')]), comment('c2', 't1_c0')]),
+                more_comments('m0', 't3_s0'),
+                comment('c3', 't3_s0')]
+    page = redterm.pages.PageSubmission(submission(comments), 80, stream=False)
+    page.item_selected = 6  # c3
+
+    expand(page, [3])  # m1
+
+    nodes = page.comment_tree.nodes
+    assert [(node.comment.id, node.index, node.end, node.depth) for node in nodes] == [
+        ('c0', 0, 6, 0), ('c1', 1, 5, 1), ('m1a', 2, 4, 2), ('m1b', 3, 4, 3), ('m1c', 4, 5, 2), ('c2', 5, 6, 1),
+        ('m0', 6, 7, 0), ('c3', 7, 8, 0)]
+    assert nodes[1].reply_count == 2
+    assert page.items[page.item_selected].id == 'c3'
+
+    expand(page, [7])  # m0
+    assert [node.comment.id for node in page.comment_tree.nodes] == ['c0', 'c1', 'm1a', 'm1b', 'm1c', 'c2',
+                                                                     'm0a', 'm0b', 'm0c', 'c3']
+    check_like_fresh_page(page, comments)
+
+
+@pytest.mark.parametrize('collapsed_ids', ((), ('c1',), ('c0',), ('c0', 'c4')))
+def test_splice_keeps_collapsed_comments(stub_more_comments, collapsed_ids):
+    comments = [comment('c0', 't3_s0', [comment('c1', 't1_c0', [more_comments('m1', 't1_c1'), comment('c5', 't1_c1')]),
+                                        comment('c4', 't1_c0', [comment('c6', 't1_c4')])]),
+                more_comments('m0', 't3_s0'),
+                comment('c3', 't3_s0', [comment('c7', 't1_c3')])]
+    page = redterm.pages.PageSubmission(submission(comments), 80, stream=False)
+    for item_no in reversed(range(len(page.items))):
+        if page.items[item_no].id in collapsed_ids:
+            page.toggle_collapse(item_no)
+    page.item_strings_formatted
+
+    page.expand_all_more_comments()
+    expand(page, [])
+
+    check_like_fresh_page(page, comments, collapsed_ids)
+
+
+def test_splice_patches_render_buffer_like_fresh_layout(stub_more_comments, make_io):
+    comments = fixtures.make_comment_tree(600, more_every=10)
+    page = redterm.pages.PageSubmission(submission(comments), 80, stream=False)
+    terminal_io = make_io(page)
+    terminal_io.render()
+
+    page.expand_all_more_comments()
+    expand(page, [])
+    terminal_io.render()
+
+    check_like_fresh_page(page, comments)
+    assert terminal_io.render_buffer == page.item_strings_formatted
@@ -0,0 +1,75 @@
+"""LineIndex must agree with a plain list of prefix sums of item heights, which it stands in for."""
+
+import bisect
+import itertools
+import random
+
+import pytest
+
+import redterm.layout
+
+
+def check(line_index, heights):
+    """Check line_index against prefix sums of heights, on every line and on lines past the end."""
+
+    locations = [0] + list(itertools.accumulate(heights))
+
+    assert len(line_index) == len(heights)
+    assert line_index.heights == heights
+    assert [line_index[item_no] for item_no in range(len(heights))] == locations[:-1]
+    assert line_index.total == locations[-1]
+    assert line_index._tree == redterm.layout.LineIndex(heights)._tree  # Same as tree built from scratch
+
+    if not heights:
+        with pytest.raises(IndexError):
+            line_index.find(0)
+        return
+
+    assert line_index[-1] == locations[-2]
+    with pytest.raises(IndexError):
+        line_index[len(heights)]
+
+    for line in range(-2, locations[-1] + 3):
+        # Item on line is the last one starting on or above it, which skips items taking up no lines
+        item_count = max(bisect.bisect_right(locations, line) - 1, 0)
+        assert line_index.find(line) == min(item_count, len(heights) - 1), line
+
+
+def random_height(rng):
+    return rng.choice((0, 0, 1, 2, 3, 7))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_line_index_matches_prefix_sums(seed):
+    rng = random.Random(seed)
+    heights = [random_height(rng) for item_no in range(rng.randint(0, 5))]
+    line_index = redterm.layout.LineIndex(heights)
+    heights = list(heights)
+    check(line_index, heights)
+
+    for step in range(200):
+        operation = rng.choice(('append', 'append', 'set', 'replace'))
+        if operation == 'append' or not heights:
+            height = random_height(rng)
+            line_index.append(height)
+            heights.append(height)
+        elif operation == 'set':
+            item_no = rng.randrange(len(heights))
+            height = random_height(rng)
+            line_index.set(item_no, height)
+            heights[item_no] = height
+        else:
+            item_start = rng.randrange(len(heights) + 1)
+            item_end = rng.randint(item_start, min(item_start + 5, len(heights)))
+            new_heights = [random_height(rng) for item_no in range(rng.randint(0, 6))]
+            line_index.replace(item_start, item_end, new_heights)
+            heights[item_start:item_end] = new_heights
+
+        check(line_index, heights)
+
+
+def test_line_index_of_hidden_items_only():
+    line_index = redterm.layout.LineIndex([0, 0, 0])
+
+    assert line_index.total == 0
+    assert [line_index.find(line) for line in (-1, 0, 5)] == [0, 2, 2]
@@ -0,0 +1,56 @@
+"""Listings fetched a batch at a time in background, from a generator standing in for reddit."""
+
+import threading
+import time
+
+import redterm.pages
+
+from benchmarks import fixtures
+
+
+def slow_listing(count, started, delay=0.001):
+    """Yield count submissions once started is set, taking delay seconds for each like reddit would."""
+
+    started.wait(5)
+    for submission in fixtures.make_listing(count):
+        time.sleep(delay)
+        yield submission
+
+
+def wait_loaded(page):
+    deadline = time.monotonic() + 5
+    while page.loading:
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.001)
+
+
+def test_stream_merges_batches_in_order():
+    started = threading.Event()
+    page = redterm.pages.PageSubreddit('python', 80, submissions=slow_listing(60, started), stream=True)
+
+    # First batch is fetched in background, so page is there before any items are
+    assert page.loading
+    assert not page.poll() and page.items == []
+    fetcher = page._fetcher
+    page.prefetch()
+    assert page._fetcher is fetcher
+
+    started.set()
+    batch_sizes = []
+    while not page._exhausted or page.loading or not page._batches.empty():
+        wait_loaded(page)
+        page.prefetch()  # Waits for batch fetched to be merged before fetching the next one
+        item_count = len(page.items)
+        assert page.poll()
+        batch_sizes.append(len(page.items) - item_count)
+        page.prefetch()
+
+    assert batch_sizes == [redterm.pages.LIMIT, redterm.pages.LIMIT, 60 - 2 * redterm.pages.LIMIT]
+    assert [item.id for item in page.items] == ['s{}'.format(submission_no) for submission_no in range(60)]
+    assert page.item_strings[-1].text.startswith('60. ')
+
+    # Nothing is left to fetch
+    fetcher = page._fetcher
+    page.prefetch()
+    assert page._fetcher is fetcher and not page.loading
+    assert not page.poll()
@@ -0,0 +1,116 @@
+"""Scheduler runs plain functions in place of reddit requests, so that no network is needed."""
+
+import threading
+import time
+
+import pytest
+
+import redterm.scheduler
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.001)
+
+
+class Blocked:
+    """Scheduler with its only slot taken by a request which runs until released, so that later requests queue up."""
+
+    def __init__(self):
+        self.scheduler = redterm.scheduler.Scheduler(rate=None, concurrency=1)
+        self.release = threading.Event()
+        self.ran = []
+        self.threads = [threading.Thread(target=self.scheduler.call, args=('blocker', self.release.wait))]
+        self.threads[0].start()
+        wait_for(lambda: self.scheduler._running == 1)
+
+    def call(self, key, priority, queued):
+        """Make request in a new thread, returning once scheduler has queued number of requests given."""
+
+        thread = threading.Thread(target=self.scheduler.call, args=(key, lambda: self.ran.append(key), priority))
+        thread.start()
+        self.threads.append(thread)
+        wait_for(lambda: self.scheduler._queued == queued)
+
+    def finish(self):
+        self.release.set()
+        for thread in self.threads:
+            thread.join(5)
+        return self.ran
+
+
+def test_user_requests_go_before_prefetching():
+    blocked = Blocked()
+    blocked.call('prefetch 1', redterm.scheduler.PREFETCH, 1)
+    blocked.call('prefetch 2', redterm.scheduler.PREFETCH, 2)
+    blocked.call('user', redterm.scheduler.USER, 3)
+
+    assert blocked.finish() == ['user', 'prefetch 1', 'prefetch 2']
+
+
+def test_queued_request_is_promoted_by_user_request_with_same_key():
+    blocked = Blocked()
+    blocked.call('other', redterm.scheduler.PREFETCH, 1)
+    blocked.call('page', redterm.scheduler.PREFETCH, 2)
+
+    # Shares queued request rather than queuing another, moving it ahead of other prefetching
+    thread = threading.Thread(target=blocked.scheduler.call, args=('page', lambda: blocked.ran.append('again')))
+    thread.start()
+    blocked.threads.append(thread)
+    wait_for(lambda: blocked.scheduler.deduplicated == 1)
+
+    assert blocked.finish() == ['page', 'other']
+    assert blocked.scheduler.requests == 3
+    assert blocked.scheduler.queue_depth_max == 2
+
+
+def test_requests_with_same_key_share_exception():
+    scheduler = redterm.scheduler.Scheduler(rate=None)
+    release = threading.Event()
+    calls = []
+    errors = []
+
+    def fail():
+        calls.append(1)
+        release.wait()
+        raise ValueError('reddit is down')
+
+    def call():
+        try:
+            scheduler.call('comments', fail)
+        except ValueError as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=call) for thread_no in range(3)]
+    threads[0].start()
+    wait_for(lambda: calls)
+    for thread in threads[1:]:
+        thread.start()
+    wait_for(lambda: scheduler.deduplicated == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(errors) == 3 and errors[0] is errors[1] is errors[2]
+
+    # Key is free again once request is done
+    with pytest.raises(ValueError):
+        scheduler.call('comments', fail)
+    assert len(calls) == 2
+
+
+def test_token_bucket_lets_burst_go_then_keeps_to_rate():
+    scheduler = redterm.scheduler.Scheduler(rate=20, burst=3)
+    times = []
+
+    time_start = time.monotonic()
+    for request_no in range(7):
+        scheduler.call(None, lambda: times.append(time.monotonic() - time_start))
+
+    assert times[2] < 0.04                                                     # Burst goes at once
+    gaps = [later - earlier for earlier, later in zip(times[2:], times[3:])]
+    assert all(gap > 0.04 for gap in gaps)                                     # Then one request per 1 / rate seconds
+    assert times[-1] == pytest.approx(4 / 20, abs=0.04)
@@ -0,0 +1,126 @@
+"""Moving selection through pages drawn on a headless terminal."""
+
+import io
+
+import pytest
+
+import redterm.pages
+import redterm.terminal
+
+
+def loaded_chunks(page):
+    """Wait until all comments of page are loaded in background, and return chunks of them not yet merged into page."""
+
+    page._loader.join()
+    chunks = []
+    while not page._chunks.empty():
+        chunks.append(page._chunks.get_nowait())
+    return chunks
+
+
+@pytest.mark.parametrize('virtual', (False, True))
+def test_jumps_right_after_merging_comments(reddit, make_io, virtual):
+    page = redterm.pages.PageSubmission(reddit.submission, 80, virtual=virtual)
+    terminal_io = make_io(page)
+    chunks = loaded_chunks(page)
+    page._chunks.put(chunks[0])
+    page.poll()
+    terminal_io.render()
+
+    # Rest of thread is merged, and keys are handled before page is rendered again
+    for chunk in chunks[1:]:
+        page._chunks.put(chunk)
+    assert page.poll()
+    terminal_io.select_item(page.item_next_sibling(1) or 1)
+    terminal_io.select_item(page.item_next_sibling(page.item_selected))
+    terminal_io.select_item_last()
+    assert page.item_selected == page.item_visible(len(page.items) - 1) > 1000
+    terminal_io.select_item_prevscreen()
+    terminal_io.select_item_first()
+    terminal_io.select_item_nextscreen()
+    terminal_io.select_item_percent(50)
+    terminal_io.render()
+
+    loc = page.item_onscreenlocs[page.item_selected]
+    assert terminal_io.render_offset <= loc < terminal_io.render_offset + terminal_io.terminal_height
+
+
+@pytest.mark.parametrize('key', ('first', 'last', 'nextscreen'))
+@pytest.mark.parametrize('virtual', (False, True))
+def test_jumps_right_after_first_batch_of_listing(reddit, make_io, key, virtual):
+    page = redterm.pages.PageSubreddit('python', 80, submissions=iter(reddit.submissions), stream=True, virtual=virtual)
+    terminal_io = make_io(page)
+    terminal_io.render()  # Empty first frame, while first batch is fetched
+    assert terminal_io.render_offset is None
+
+    page._fetcher.join()
+    assert page.poll()
+    getattr(terminal_io, 'select_item_' + key)()
+    terminal_io.render()
+
+    assert page.item_selected == {'first': 0, 'last': redterm.pages.LIMIT - 1}.get(key, page.item_selected)
+    loc = page.item_onscreenlocs[page.item_selected]
+    assert terminal_io.render_offset <= loc < terminal_io.render_offset + terminal_io.terminal_height
+
+
+def test_pages_left_open_are_closed_on_exit(reddit, make_io):
+    pages = [redterm.pages.PageSubreddit('python', 80, submissions=iter(reddit.submissions)),
+             redterm.pages.PageSubmission(reddit.submission, 80)]
+    terminal_io = make_io(pages[0])
+    terminal_io.pages.append(pages[1])
+
+    with terminal_io.setup():
+        pass
+
+    assert pages[1]._cancelled.is_set()
+
+
+class Stream(io.StringIO):
+    """Stream counting writes made to it."""
+
+    writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return io.StringIO.write(self, text)
+
+
+def test_screen_writes_only_changed_rows_once_per_frame(terminal):
+    screen = redterm.terminal.Screen(Stream())
+
+    screen.draw(['one', 'two', 'three'])
+    assert screen.stream.writes == 1
+    assert all(row in screen.stream.getvalue() for row in ('one', 'two', 'three'))
+
+    screen.stream.seek(0)
+    screen.stream.truncate()
+    screen.draw(['one', 'TWO', 'three'])
+    assert screen.stream.writes == 2
+    assert screen.stream.getvalue() == terminal.move(1, 0) + 'TWO'
+
+    screen.draw(['one', 'TWO', 'three'])
+    assert screen.stream.writes == 2
+    assert screen.stats()['frames'] == 3
+    assert screen.stats()['bytes_written'] < screen.stats()['bytes_full']
+
+
+def test_frame_is_kept_while_waiting_to_reflow(reddit, terminal, make_io):
+    page = redterm.pages.PageSubreddit('python', 80, submissions=iter(reddit.submissions))
+    terminal_io = make_io(page)
+    terminal_io.render()
+    frames = terminal_io.screen.frames
+
+    # Keys and background work render page while terminal is being resized
+    terminal.resize(40, 24)
+    terminal_io.on_resize()
+    terminal_io.select_item_next()
+    terminal_io.render()
+    assert terminal_io.screen.frames == frames
+    assert not terminal_io.reflow_if_resized()
+
+    terminal_io._resize_time -= redterm.terminal.RESIZE_QUIET
+    assert terminal_io.reflow_if_resized()
+    assert terminal_io.screen.frames == frames + 1
+    rows = [row.split(terminal.move(row_no, 0))[0] for row_no, row in enumerate(terminal_io.screen.rows)]  # Without cursor
+    assert all(terminal.length(row) == 40 for row in rows)
+    assert page.item_selected == 1
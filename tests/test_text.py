@@ -0,0 +1,58 @@
+"""StyledText.wrap() must break lines where blessed's Terminal.wrap() does, which pages used to lay out items with."""
+
+import random
+
+import blessed
+import pytest
+
+import redterm.pages
+import redterm.text
+
+
+WIDTHS = (1, 2, 3, 5, 7, 10, 17, 30, 79)
+PIECES = ('hello', 'world', 'a', 'longwordwithoutspaces' * 3, 'hyphen-ated', '--', 'well-known-thing', 'x' * 40,
+          'https://example.com/a-b/c?d=e-f', '中文字符', '日本語のテキスト', '한국어', 'ｆｕｌｌｗｉｄｔｈ', '-中文-', '中',
+          'é', 'äb', 'café', 'Ω', '—', '​', '　', '\t', 'ab\tc', ' ', '  ', '.')
+CASES = ('', ' ', '   ', '\t', ' \t ', '　', 'a', ' a', 'a ', '  leading', 'trailing  ', 'two  spaces', 'tab\tin\tline')
+
+terminal = blessed.Terminal(kind='xterm-256color', force_styling=True)
+
+
+def random_lines(count, seed=0):
+    """Return lines made of random pieces, mixing narrow, wide and zero width characters with whitespace."""
+
+    rng = random.Random(seed)
+    return [''.join(rng.choice(PIECES) + rng.choice(('', ' ', ' ', '  ')) for piece_no in range(rng.randint(1, 12)))
+            for line_no in range(count)]
+
+
+def wrapped(text, width):
+    return [line.text for line in redterm.text.StyledText(text).wrap(width)]
+
+
+@pytest.mark.parametrize('text', CASES)
+@pytest.mark.parametrize('width', WIDTHS)
+def test_wrap_matches_blessed_on_blank_and_whitespace_lines(text, width):
+    assert wrapped(text, width) == terminal.wrap(text, width)
+
+
+def test_wrap_matches_blessed_on_random_lines():
+    for text in random_lines(500):
+        for width in WIDTHS:
+            assert wrapped(text, width) == terminal.wrap(text, width), (text, width)
+
+
+def test_wrap_keeps_styles_on_wrapped_text():
+    text = redterm.text.styles.bold('bold words') + ' plain ' + redterm.text.styles.cyan('cyan words')
+    lines = text.wrap(12)
+
+    assert [line.text for line in lines] == ['bold words', 'plain cyan', 'words'] == terminal.wrap(text.text, 12)
+    assert [line.runs for line in lines] == [((0, 10, 'bold'),), ((6, 10, 'cyan'),), ((0, 5, 'cyan'),)]
+
+
+def test_layout_adds_no_rows_for_blank_lines():
+    page = redterm.pages.PageBase('test', 40)
+    page.item_strings.append(redterm.text.StyledText('* para one\n\npara two\n'))
+    page.item_indentations.append(0)
+
+    assert [line.text.rstrip() for line in page.item_strings_formatted] == ['  │* para one', '  │para two', '']